@@ -1,5 +1,6 @@
 from __future__ import absolute_import
-from rouge.rouge import FilesRouge, Rouge
+from .rouge import FilesRouge, Rouge
+from .rouge_score import PreparedText, TokenVocabulary
 
 __version__ = "1.0.1"
-__all__ = ["FilesRouge", "Rouge"]
+__all__ = ["FilesRouge", "Rouge", "PreparedText", "TokenVocabulary"]
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Text analysis pipeline
+
+An `Analysis` holds the stages shown for a text (normalized tokens, word
+count, word frequencies, summary, word cloud). Each stage is computed the
+first time it is read and memoized, so a page only pays for the stages it
+actually displays. The text is tokenized once: the word count and the
+word-frequency index are built from the same tokens, and the index is
+shared by the bar chart and the word cloud, which is rendered straight to
+PNG bytes by a `WordCloudRenderer`. The summarizer parses the raw text
+into sentences itself.
+"""
+from __future__ import absolute_import
+
+import functools
+import hashlib
+import heapq
+import io
+import json
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+from operator import itemgetter
+
+from metrics import timed
+
+
+# Words as WordCloud tokenizes them
+_WORD = re.compile(r"\w[\w']*")
+
+
+def tokenize(text):
+    """
+    Words of `text`, normalized like WordCloud does: punctuation,
+    possessive 's and numbers are dropped and case is folded, so "Data",
+    "data." and "data," are one word.
+    """
+    words = (w[:-2] if w.lower().endswith("'s") else w
+             for w in _WORD.findall(text))
+    return [w.lower() for w in words if not w.isdigit()]
+
+
+def count_words(tokens):
+    """Word-frequency index of normalized `tokens`, without stopwords"""
+    from neattext import STOPWORDS_en
+
+    return Counter(w for w in tokens if w not in STOPWORDS_en)
+
+
+def top_words(frequencies, num):
+    """The `num` most frequent (word, count) pairs of `frequencies`"""
+    return heapq.nlargest(num, frequencies.items(), key=itemgetter(1))
+
+
+RenderedImage = namedtuple("RenderedImage", ("png", "seconds", "cached"))
+
+
+class WordCloudRenderer(object):
+    """
+    Renders word clouds of frequency tables to PNG bytes, without
+    matplotlib figures, and keeps the encoded images in an LRU cache keyed
+    by the SHA-256 of the frequency table. Safe to share between threads.
+
+    Args:
+      width: image width in pixels
+      height: image height in pixels
+      max_entries: number of images kept
+      max_bytes: maximum total size of the images kept
+    """
+
+    def __init__(self, width=1000, height=500, max_entries=32,
+                 max_bytes=32 << 20):
+        self.width = width
+        self.height = height
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.render_seconds = 0.0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "render_seconds": self.render_seconds,
+        }
+
+    def render(self, frequencies):
+        """
+        `RenderedImage` of the word cloud of `frequencies` (word -> count),
+        with the seconds its rendering took and whether it was cached.
+
+        Raises:
+          ValueError: if `frequencies` is empty
+        """
+        key = self._key(frequencies)
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return RenderedImage(png, 0.0, True)
+
+        from wordcloud import WordCloud
+
+        start = time.perf_counter()
+        cloud = WordCloud(width=self.width, height=self.height)
+        image = cloud.generate_from_frequencies(frequencies).to_image()
+        buf = io.BytesIO()
+        image.save(buf, format="PNG")
+        png = buf.getvalue()
+        seconds = time.perf_counter() - start
+
+        with self._lock:
+            self.misses += 1
+            self.render_seconds += seconds
+            if key not in self._entries:
+                self._entries[key] = png
+                self._size += len(png)
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._size > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return RenderedImage(png, seconds, False)
+
+    def _key(self, frequencies):
+        table = json.dumps(sorted(frequencies.items()), ensure_ascii=False)
+        return "%dx%d-%s" % (self.width, self.height,
+                             hashlib.sha256(table.encode("utf-8"))
+                             .hexdigest())
+
+
+_DEFAULT_RENDERER = None
+
+
+def _get_default_renderer():
+    global _DEFAULT_RENDERER
+    if _DEFAULT_RENDERER is None:
+        _DEFAULT_RENDERER = WordCloudRenderer()
+    return _DEFAULT_RENDERER
+
+
+def stage(fn):
+    """Lazily computed, memoized and timed attribute of an `Analysis`"""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(self):
+        if name not in self._stages:
+            with timed(name):
+                self._stages[name] = fn(self)
+        return self._stages[name]
+    return property(wrapper)
+
+
+class Analysis(object):
+    """
+    Lazy analysis of `text`.
+
+    Args:
+      text: text to analyze
+      num: number of summary sentences
+      summarizer: callable (text, num) -> summary
+      indexer: callable tokens -> word-frequency index, e.g. a cached
+               `count_words`
+      renderer: `WordCloudRenderer` of the word cloud, a shared default
+                one if None
+    """
+
+    def __init__(self, text, num, summarizer, indexer=count_words,
+                 renderer=None):
+        self.text = text
+        self.num = num
+        self.summarizer = summarizer
+        self.indexer = indexer
+        self.renderer = renderer
+        self._stages = {}
+
+    @stage
+    def tokens(self):
+        return tokenize(self.text)
+
+    @stage
+    def word_count(self):
+        return len(self.tokens)
+
+    @stage
+    def frequencies(self):
+        return self.indexer(self.tokens)
+
+    @stage
+    def summary(self):
+        return self.summarizer(self.text, self.num)
+
+    @stage
+    def wordcloud(self):
+        renderer = self.renderer or _get_default_renderer()
+        return renderer.render(self.frequencies)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Batch URL analysis
+
+Pages are fetched concurrently on a thread pool (bounded overall and per
+host), while Goose extraction and LexRank summarization run on a process
+pool. Results are yielded as soon as each URL is done, so a batch takes
+about as long as its slowest few URLs rather than the sum of all of them.
+"""
+from __future__ import absolute_import
+
+import os
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+
+from goose3 import Goose
+
+from fetch import HostLimiter
+from lexrank import summarize
+
+_goose = None
+
+
+def analyze_html(content, num, language="english"):
+    """(cleaned text, summary of `num` sentences) of an HTML page"""
+    global _goose
+    if _goose is None:
+        _goose = Goose()
+    text = _goose.extract(raw_html=content).cleaned_text
+    summary = " ".join(summarize(text, num, language)) if text.strip() else ""
+    return text, summary
+
+
+def _fetch(fetcher, limiter, url):
+    with limiter.limit(url):
+        return fetcher.fetch(url)
+
+
+def analyze_urls(urls, num, fetcher, max_fetches=16, max_per_host=2,
+                 host_interval=0.0, n_jobs=None, executor=None):
+    """
+    Fetches and summarizes `urls`, yielding one result per URL in
+    completion order.
+
+    Args:
+      urls: URLs to analyze
+      num: number of summary sentences
+      fetcher: `fetch.Fetcher` used for the requests
+      max_fetches: maximum number of requests in flight
+      max_per_host: maximum number of requests in flight per host
+      host_interval: minimum seconds between request starts per host
+      n_jobs: number of extraction/summarization processes, all cores if
+              None
+      executor: process pool to extract and summarize on, shared with
+                other callers and left running, instead of a pool of
+                `n_jobs` workers started for this batch
+
+    Yields:
+      dicts with the "url", its "words" count, "summary" and "error" (None
+      when the analysis succeeded)
+    """
+    urls = list(urls)
+    if not urls:
+        return
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    limiter = HostLimiter(max_per_host=max_per_host,
+                          min_interval=host_interval)
+
+    fetch_pool = ThreadPoolExecutor(max_workers=max_fetches)
+    if executor is None:
+        analysis_pool = ProcessPoolExecutor(max_workers=n_jobs)
+    else:
+        analysis_pool = executor
+    analyses = {}
+    try:
+        fetches = {fetch_pool.submit(_fetch, fetcher, limiter, url): url
+                   for url in urls}
+        pending = set(fetches)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetches:
+                    url = fetches.pop(future)
+                    try:
+                        content = future.result()
+                    except Exception as e:
+                        yield {"url": url, "words": 0, "summary": "",
+                               "error": str(e)}
+                        continue
+                    analysis = analysis_pool.submit(analyze_html, content,
+                                                    num)
+                    analyses[analysis] = url
+                    pending.add(analysis)
+                else:
+                    url = analyses.pop(future)
+                    try:
+                        text, summary = future.result()
+                    except Exception as e:
+                        yield {"url": url, "words": 0, "summary": "",
+                               "error": str(e)}
+                        continue
+                    yield {"url": url, "words": len(text.split()),
+                           "summary": summary, "error": None}
+    finally:
+        # a consumer that stops early (a rerun, an exception) must not wait
+        # for the queued fetches and analyses
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        if executor is None:
+            analysis_pool.shutdown(wait=False, cancel_futures=True)
+        else:
+            for future in analyses:
+                future.cancel()
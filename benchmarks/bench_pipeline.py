@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""Analyzer pipeline benchmarks
+
+Runs the stages of the app headlessly on generated PDF, DOCX and text
+fixtures of several sizes and reports the p50/p95 latency and the peak RSS
+of every stage:
+
+- extract: `ingest.extract_text`, as done for uploads
+- tokens: `analysis.tokenize`, the normalized words
+- frequencies: `analysis.count_words`, the word-frequency index
+- summarize: `lexrank.summarize_document`, hierarchical on long texts
+- wordcloud: `analysis.WordCloudRenderer.render`, uncached
+- word_freq: top words and the Altair bar chart spec
+
+Every (stage, fixture) case runs in its own worker process, so the peak RSS
+is the one of that stage alone. Results are saved and compared like the
+ROUGE benchmarks.
+
+    python benchmarks/bench_pipeline.py --save pipeline_baseline.json
+    python benchmarks/bench_pipeline.py --baseline pipeline_baseline.json
+"""
+from __future__ import absolute_import, division, print_function
+
+import io
+import math
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_rouge import check_baseline, save_baseline  # noqa: E402
+
+SEED = 2017
+# The word limit of the app
+WORD_LIMIT = 50000
+NUM_SENTENCES = 5
+FILE_TYPES = {
+    "pdf": "application/pdf",
+    "txt": "text/plain",
+    "docx": "application/vnd.openxmlformats-officedocument"
+            ".wordprocessingml.document",
+}
+WORDS = (
+    "the of and to in is that for it as with was on be by this are from "
+    "at an or which have not has but were their been more one all its "
+    "market government company report people system research water city "
+    "energy policy school health data music family science history "
+    "council result program student study change power growth price "
+    "network support evidence project design model process service "
+    "increase develop provide announce describe explain measure produce "
+    "public national local economic social significant important recent "
+    "early large small new different major general political financial"
+).split()
+
+
+def make_text(num_words, seed=SEED):
+    """Paragraphs of sentences of 8 to 25 words, `num_words` words in all"""
+    rng = random.Random(seed)
+    paragraphs, sentences, left = [], [], num_words
+    while left > 0:
+        length = min(left, rng.randint(8, 25))
+        words = rng.choices(WORDS, k=length)
+        sentences.append(" ".join(words).capitalize() + ".")
+        left -= length
+        if len(sentences) == 6:
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    if sentences:
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def make_pdf(text, words_per_line=12, lines_per_page=50):
+    """Bytes of a PDF of `text` in Helvetica, written without any PDF
+    library"""
+    words = text.split()
+    lines = [" ".join(words[i:i + words_per_line])
+             for i in range(0, len(words), words_per_line)]
+    pages = [lines[i:i + lines_per_page]
+             for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in pages:
+        content = ["BT /F1 10 Tf 12 TL 40 800 Td"]
+        for line in page:
+            line = line.replace("\\", "\\\\").replace("(", "\\(") \
+                .replace(")", "\\)")
+            content.append("(%s) Tj T*" % line)
+        content.append("ET")
+        stream = "\n".join(content).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream"
+                       % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R "
+                       b"/MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> "
+                       b"/Contents %d 0 R >>" % (len(objects)))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(kids), len(kids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+              % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def make_docx(text):
+    """Bytes of a minimal DOCX of `text`, one paragraph per text
+    paragraph"""
+    namespace = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    paragraphs = "".join(
+        '<w:p><w:r><w:t xml:space="preserve">%s</w:t></w:r></w:p>'
+        % escape(paragraph) for paragraph in text.split("\n\n"))
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+            'content-types">'
+            '<Default Extension="rels" ContentType="application/'
+            'vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType="'
+            + FILE_TYPES["docx"] + '.main+xml"/></Types>')
+        docx.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+            '2006/relationships"><Relationship Id="rId1" Type="http://'
+            'schemas.openxmlformats.org/officeDocument/2006/relationships/'
+            'officeDocument" Target="word/document.xml"/></Relationships>')
+        docx.writestr(
+            "word/document.xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="%s"><w:body>%s</w:body></w:document>'
+            % (namespace, paragraphs))
+    return out.getvalue()
+
+
+def write_fixtures(directory, sizes):
+    """Paths of the generated fixtures, {(kind, words): path}"""
+    fixtures = {}
+    for words in sizes:
+        text = make_text(words)
+        for kind, data in (("txt", text.encode("utf-8")),
+                           ("pdf", make_pdf(text)),
+                           ("docx", make_docx(text))):
+            path = os.path.join(directory, "fixture-%d.%s" % (words, kind))
+            if not os.path.isfile(path):
+                with open(path, "wb") as f:
+                    f.write(data)
+            fixtures[kind, words] = path
+    return fixtures
+
+
+def setup_stage(stage, path, kind):
+    """Callable running `stage` on the fixture at `path`; its input is
+    prepared here, out of the timings"""
+    from ingest import extract_text
+
+    if stage == "extract":
+        with open(path, "rb") as f:
+            data = f.read()
+        return lambda: extract_text(data, FILE_TYPES[kind],
+                                    max_words=WORD_LIMIT)
+
+    text = extract_text(path, FILE_TYPES[kind])
+    from analysis import WordCloudRenderer, count_words, tokenize, top_words
+
+    if stage == "tokens":
+        return lambda: tokenize(text)
+    tokens = tokenize(text)
+    if stage == "frequencies":
+        return lambda: count_words(tokens)
+    if stage == "summarize":
+        from lexrank import summarize_document
+
+        return lambda: summarize_document(text, NUM_SENTENCES)
+    if stage == "wordcloud":
+        frequencies = count_words(tokens)
+        # nothing kept, every render is a miss
+        renderer = WordCloudRenderer(max_entries=0)
+        return lambda: renderer.render(frequencies)
+    if stage == "word_freq":
+        import altair as alt
+        import pandas as pd
+
+        frequencies = count_words(tokens)
+
+        def word_freq():
+            top = dict(top_words(frequencies, 10))
+            frame = pd.DataFrame({"Tokens": list(top.keys()),
+                                  "Counts": list(top.values())})
+            return alt.Chart(frame).mark_bar() \
+                .encode(x="Tokens", y="Counts").to_dict()
+        return word_freq
+    raise ValueError("Unknown stage %r" % stage)
+
+
+def run_case(stage, path, kind, repeat):
+    """(latencies in seconds, peak RSS in bytes) of `repeat` runs of a
+    stage, after a warm-up run; called in a fresh worker process"""
+    fn = setup_stage(stage, path, kind)
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return samples, peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(samples, q):
+    """Nearest-rank `q` percentile of `samples`"""
+    ordered = sorted(samples)
+    return ordered[max(0, int(math.ceil(q / 100 * len(ordered))) - 1)]
+
+
+STAGES = ("extract", "tokens", "frequencies", "summarize",
+          "wordcloud", "word_freq")
+
+
+@click.command()
+@click.option("-s", "--size", "sizes", multiple=True, type=int,
+              default=(1000, 10000, WORD_LIMIT), show_default=True,
+              help="Fixture sizes in words.")
+@click.option("-k", "--stage", "stages", multiple=True,
+              type=click.Choice(STAGES),
+              help="Only run these stages, all by default.")
+@click.option("--repeat", default=5, show_default=True,
+              help="Number of timed runs per case.")
+@click.option("--fixtures", "fixtures_dir", default=None,
+              type=click.Path(file_okay=False),
+              help="Directory to generate the fixtures in and reuse them "
+                   "from, a temporary one by default.")
+@click.option("--save", "save_path", default=None,
+              type=click.Path(dir_okay=False),
+              help="Write the results to this JSON baseline.")
+@click.option("--baseline", "baseline_path", default=None,
+              type=click.Path(exists=True, dir_okay=False),
+              help="Compare the results with this JSON baseline.")
+@click.option("--threshold", default=0.2, show_default=True,
+              help="Allowed relative increase of latency and peak RSS.")
+def main(sizes, stages, repeat, fixtures_dir, save_path, baseline_path,
+         threshold):
+    """Benchmark the analyzer stages, optionally against a baseline."""
+    directory = fixtures_dir or tempfile.mkdtemp(prefix="bench_pipeline-")
+    os.makedirs(directory, exist_ok=True)
+    results = {}
+    try:
+        fixtures = write_fixtures(directory, sizes)
+        click.echo("%-40s %12s %12s %12s" % ("case", "p50 ms", "p95 ms",
+                                             "peak MiB"))
+        for stage in stages or STAGES:
+            # the text stages only depend on the extracted text
+            kinds = ("pdf", "docx", "txt") if stage == "extract" \
+                else ("txt",)
+            for words in sizes:
+                for kind in kinds:
+                    with ProcessPoolExecutor(max_workers=1) as executor:
+                        samples, peak = executor.submit(
+                            run_case, stage, fixtures[kind, words], kind,
+                            repeat).result()
+                    name = "%s-%s-w%d" % (stage, kind, words)
+                    results[name] = {
+                        "p50_seconds": percentile(samples, 50),
+                        "p95_seconds": percentile(samples, 95),
+                        "peak_rss_bytes": peak,
+                    }
+                    click.echo("%-40s %12.1f %12.1f %12.1f" % (
+                        name, results[name]["p50_seconds"] * 1000,
+                        results[name]["p95_seconds"] * 1000,
+                        peak / float(1 << 20)))
+    finally:
+        if fixtures_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if save_path is not None:
+        save_baseline(save_path, results)
+    if baseline_path is not None:
+        check_baseline(baseline_path, results, threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""ROUGE scoring benchmarks
+
+Times `rouge_score` (n-gram intersection, ROUGE-N, summary-level ROUGE-L)
+and `Rouge`/`FilesRouge` scoring on seeded synthetic corpora that vary the
+number of sentences, tokens per sentence, n and exclusive mode, and records
+the median time and the peak traced memory of every case. Results can be
+saved as a JSON baseline and compared with a previous one; the run fails
+when a case is slower or bigger than the baseline by more than the
+threshold. Cases run with both `Rouge` backends are also reported as the
+speedup of the "numpy" backend over the "python" one.
+
+    python benchmarks/bench_rouge.py --save benchmarks/rouge_baseline.json
+    python benchmarks/bench_rouge.py --baseline benchmarks/rouge_baseline.json
+"""
+from __future__ import absolute_import, division, print_function
+
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rouge_score  # noqa: E402
+from rouge import FilesRouge, Rouge  # noqa: E402
+
+SEED = 2017
+VOCABULARY_SIZE = 5000
+# Cases named "...-<backend>" are also reported as speedups over "python"
+BACKENDS = ("python", "numpy")
+
+
+def make_sentences(rng, num_sentences, num_tokens):
+    """`num_sentences` sentences of `num_tokens` Zipf-distributed words"""
+    weights = [1.0 / rank for rank in range(1, VOCABULARY_SIZE + 1)]
+    words = ["w%d" % i for i in range(VOCABULARY_SIZE)]
+    return [" ".join(rng.choices(words, weights, k=num_tokens))
+            for _ in range(num_sentences)]
+
+
+def make_text(rng, num_sentences, num_tokens):
+    return " . ".join(make_sentences(rng, num_sentences, num_tokens))
+
+
+def make_pair(rng, num_sentences, num_tokens):
+    """(hypothesis, reference) sentences, the hypothesis sharing about half
+    of its sentences with the reference so overlaps are realistic"""
+    reference = make_sentences(rng, num_sentences, num_tokens)
+    hypothesis = [sentence if rng.random() < 0.5 else other
+                  for sentence, other in zip(
+                      reference, make_sentences(rng, num_sentences,
+                                                num_tokens))]
+    return hypothesis, reference
+
+
+def bench_intersection(num_sentences, num_tokens, n, exclusive):
+    hypothesis, reference = make_pair(random.Random(SEED), num_sentences,
+                                      num_tokens)
+    hyp_ngrams = rouge_score._get_word_ngrams(n, hypothesis, exclusive)
+    ref_ngrams = rouge_score._get_word_ngrams(n, reference, exclusive)
+    return lambda: hyp_ngrams.intersection(ref_ngrams)
+
+
+def bench_rouge_n(num_sentences, num_tokens, n, exclusive):
+    hypothesis, reference = make_pair(random.Random(SEED), num_sentences,
+                                      num_tokens)
+    return lambda: rouge_score.rouge_n(hypothesis, reference, n,
+                                       exclusive=exclusive)
+
+
+def bench_rouge_l(num_sentences, num_tokens, exclusive):
+    hypothesis, reference = make_pair(random.Random(SEED), num_sentences,
+                                      num_tokens)
+    return lambda: rouge_score.rouge_l_summary_level(hypothesis, reference,
+                                                     exclusive=exclusive)
+
+
+def bench_get_scores(num_pairs, num_sentences, num_tokens, avg,
+                     metrics=None, backend="python", exclusive=True):
+    rng = random.Random(SEED)
+    hyps = [make_text(rng, num_sentences, num_tokens)
+            for _ in range(num_pairs)]
+    refs = [make_text(rng, num_sentences, num_tokens)
+            for _ in range(num_pairs)]
+    rouge = Rouge(metrics=metrics, backend=backend, exclusive=exclusive)
+    return lambda: rouge.get_scores(hyps, refs, avg=avg)
+
+
+def bench_files_rouge(directory, num_lines, num_sentences, num_tokens,
+                      stream):
+    rng = random.Random(SEED)
+    paths = []
+    for name in ("hyp.txt", "ref.txt"):
+        path = os.path.join(directory, "%d-%s" % (num_lines, name))
+        with io.open(path, encoding="utf-8", mode="w") as f:
+            for _ in range(num_lines):
+                f.write(make_text(rng, num_sentences, num_tokens) + "\n")
+        paths.append(path)
+    files_rouge = FilesRouge()
+    return lambda: files_rouge.get_scores(paths[0], paths[1], avg=True,
+                                          stream=stream)
+
+
+def get_cases(directory):
+    """(name, setup) of every benchmark; `setup()` returns the callable to
+    time, so corpora are only generated for the selected cases"""
+    cases = []
+    for num_sentences, num_tokens in ((5, 20), (50, 20), (50, 100)):
+        for n in (1, 2, 3):
+            for exclusive in (True, False):
+                suffix = "s%d-t%d-n%d-%s" % (
+                    num_sentences, num_tokens, n,
+                    "exclusive" if exclusive else "multiset")
+                cases.append((
+                    "intersection-" + suffix,
+                    lambda a=(num_sentences, num_tokens, n, exclusive):
+                        bench_intersection(*a)))
+                cases.append((
+                    "rouge_n-" + suffix,
+                    lambda a=(num_sentences, num_tokens, n, exclusive):
+                        bench_rouge_n(*a)))
+    # LCS-heavy: long sentences, every reference sentence against the whole
+    # hypothesis
+    for num_sentences, num_tokens in ((5, 20), (20, 100), (10, 400)):
+        for exclusive in (True, False):
+            cases.append((
+                "rouge_l-s%d-t%d-%s" % (num_sentences, num_tokens,
+                                        "exclusive" if exclusive
+                                        else "multiset"),
+                lambda a=(num_sentences, num_tokens, exclusive):
+                    bench_rouge_l(*a)))
+    for num_pairs, num_sentences, num_tokens in ((1000, 3, 20),
+                                                 (100, 10, 30)):
+        for avg in (False, True):
+            cases.append((
+                "get_scores-p%d-s%d-t%d%s" % (num_pairs, num_sentences,
+                                              num_tokens,
+                                              "-avg" if avg else ""),
+                lambda a=(num_pairs, num_sentences, num_tokens, avg):
+                    bench_get_scores(*a)))
+    # ROUGE-N only, where the numpy backend applies
+    for exclusive in (True, False):
+        for backend in BACKENDS:
+            cases.append((
+                "get_scores-p10000-s3-t20-rouge_n-%s-%s" % (
+                    "exclusive" if exclusive else "multiset", backend),
+                lambda a=(exclusive, backend): bench_get_scores(
+                    10000, 3, 20, False, ["rouge-1", "rouge-2"], a[1],
+                    exclusive=a[0])))
+    for stream in (False, True):
+        cases.append((
+            "files_rouge-l5000-s3-t20%s" % ("-stream" if stream else ""),
+            lambda stream=stream: bench_files_rouge(directory, 5000, 3, 20,
+                                                    stream)))
+    return cases
+
+
+def measure(fn, repeat, min_time):
+    """(median seconds per call, peak traced bytes of one call)"""
+    # calibrate the number of calls per sample to about `min_time` seconds
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(samples), peak
+
+
+def speedups(results):
+    """Printable speedups of the cases run with each backend over the same
+    case run with the "python" backend"""
+    lines = []
+    for name, result in sorted(results.items()):
+        prefix, _, backend = name.rpartition("-")
+        reference = results.get(prefix + "-python")
+        if backend in BACKENDS[1:] and reference is not None:
+            lines.append("%s: x%.1f faster, x%.1f peak memory" % (
+                name, reference["seconds"] / result["seconds"],
+                result["peak_bytes"] / reference["peak_bytes"]))
+    return lines
+
+
+def compare(results, baseline, threshold):
+    """Regressions of `results` over `baseline`, as printable lines: every
+    measure of a case that grew by more than `threshold`"""
+    regressions = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for key in sorted(result):
+            if previous.get(key) and \
+                    result[key] > previous[key] * (1 + threshold):
+                regressions.append("%s %s: %.6g -> %.6g (+%.0f%%)" % (
+                    name, key, previous[key], result[key],
+                    100 * (result[key] / previous[key] - 1)))
+    return regressions
+
+
+def save_baseline(path, results):
+    with io.open(path, encoding="utf-8", mode="w") as f:
+        json.dump({"python": platform.python_version(),
+                   "machine": platform.machine(),
+                   "cases": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def check_baseline(path, results, threshold):
+    """Reports the regressions of `results` over the baseline at `path`
+    and exits with status 1 if there are any"""
+    with io.open(path, encoding="utf-8") as f:
+        baseline = json.load(f)["cases"]
+    regressions = compare(results, baseline, threshold)
+    for line in regressions:
+        click.echo("REGRESSION " + line, err=True)
+    if regressions:
+        sys.exit(1)
+    click.echo("No regression over %.0f%% of the baseline"
+               % (100 * threshold), err=True)
+
+
+@click.command()
+@click.option("-k", "--select", "patterns", multiple=True,
+              help="Only run the cases whose name contains one of these.")
+@click.option("--repeat", default=5, show_default=True,
+              help="Number of timed samples per case.")
+@click.option("--min-time", default=0.1, show_default=True,
+              help="Minimum seconds per timed sample.")
+@click.option("--save", "save_path", default=None,
+              type=click.Path(dir_okay=False),
+              help="Write the results to this JSON baseline.")
+@click.option("--baseline", "baseline_path", default=None,
+              type=click.Path(exists=True, dir_okay=False),
+              help="Compare the results with this JSON baseline.")
+@click.option("--threshold", default=0.2, show_default=True,
+              help="Allowed relative increase of time and peak memory.")
+def main(patterns, repeat, min_time, save_path, baseline_path, threshold):
+    """Benchmark ROUGE scoring, optionally against a saved baseline."""
+    directory = tempfile.mkdtemp(prefix="bench_rouge-")
+    results = {}
+    try:
+        for name, setup in get_cases(directory):
+            if patterns and not any(p in name for p in patterns):
+                continue
+            seconds, peak = measure(setup(), repeat, min_time)
+            results[name] = {"seconds": seconds, "peak_bytes": peak}
+            click.echo("%-45s %12.3f ms %12d B" % (name, seconds * 1000,
+                                                   peak))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for line in speedups(results):
+        click.echo(line)
+    if save_path is not None:
+        save_baseline(save_path, results)
+    if baseline_path is not None:
+        check_baseline(baseline_path, results, threshold)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Import-time budget of the app
+
+Streamlit executes main.py again on every interaction, so importing it must
+stay cheap: this imports it in fresh interpreters, after streamlit itself,
+and fails when the median import time is over the budget or when one of the
+heavy dependencies that only some pages need is imported eagerly. The
+test suite runs the same check, see tests/test_import_time.py.
+
+    python benchmarks/check_import_time.py --budget 0.1
+"""
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET = 0.1
+
+# Only imported by the pages or stages using them
+LAZY_MODULES = ("sumy", "nltk", "scipy", "pdfplumber", "docx2txt", "goose3",
+                "wordcloud", "neattext", "validators", "lexrank", "ingest",
+                "fetch", "batch", "rouge", "rouge_score")
+
+PROBE = """
+import json, sys, time
+import streamlit, streamlit_option_menu
+before = set(sys.modules)
+start = time.perf_counter()
+import main
+seconds = time.perf_counter() - start
+loaded = sorted(set(m.split(".")[0] for m in set(sys.modules) - before))
+print(json.dumps({"seconds": seconds, "loaded": loaded}))
+"""
+
+
+def probe():
+    """(seconds, top-level modules loaded) of importing main in a fresh
+    interpreter"""
+    output = subprocess.check_output([sys.executable, "-c", PROBE], cwd=ROOT,
+                                     stderr=subprocess.DEVNULL)
+    result = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+    return result["seconds"], result["loaded"]
+
+
+def check(budget, repeat):
+    """(median seconds of `repeat` imports of main, failures as printable
+    lines)"""
+    samples, loaded = [], set()
+    for _ in range(repeat):
+        seconds, modules = probe()
+        samples.append(seconds)
+        loaded.update(modules)
+    seconds = statistics.median(samples)
+
+    failures = []
+    eager = sorted(loaded.intersection(LAZY_MODULES))
+    if eager:
+        failures.append("eagerly imported: %s" % ", ".join(eager))
+    if seconds > budget:
+        failures.append("over the import-time budget")
+    return seconds, failures
+
+
+@click.command()
+@click.option("--budget", default=DEFAULT_BUDGET, show_default=True,
+              help="Maximum median seconds to import main.py.")
+@click.option("--repeat", default=5, show_default=True,
+              help="Number of fresh interpreters to time.")
+def main(budget, repeat):
+    """Check that importing main.py stays within its budget."""
+    seconds, failures = check(budget, repeat)
+    click.echo("import main: %.1f ms (median of %d), budget %.1f ms"
+               % (seconds * 1000, repeat, budget * 1000))
+    for failure in failures:
+        click.echo("FAIL " + failure, err=True)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Headless batch analysis
+
+Walks a directory of pdf/docx/txt documents, extracts and summarizes each
+of them on a process pool and, when a directory of reference summaries is
+given, scores the summaries with ROUGE. Records are appended to a JSONL
+checkpoint as soon as they are done, so an interrupted run resumes where it
+stopped.
+
+    python cli.py CORPUS_DIR -o results.jsonl [--refs REFS_DIR]
+"""
+from __future__ import absolute_import
+
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import click
+
+from ingest import extract_text
+from lexrank import summarize_document
+from rouge import Rouge
+
+FILE_TYPES = {
+    ".pdf": "application/pdf",
+    ".txt": "text/plain",
+    ".docx": "application/vnd.openxmlformats-officedocument"
+             ".wordprocessingml.document",
+}
+
+
+def iter_documents(corpus_dir):
+    """Paths of the supported documents under `corpus_dir`, sorted"""
+    for root, dirs, files in os.walk(corpus_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in FILE_TYPES:
+                yield os.path.join(root, name)
+
+
+def find_reference(path, corpus_dir, refs_dir):
+    """Reference summary of `path`: the file with the same relative path
+    and stem, and any supported extension, under `refs_dir`"""
+    relative = os.path.splitext(os.path.relpath(path, corpus_dir))[0]
+    for extension in FILE_TYPES:
+        candidate = os.path.join(refs_dir, relative + extension)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def analyze_file(path, num, reference_path=None):
+    """Extraction, summary and optional ROUGE scores of one document"""
+    record = {"path": path, "words": 0, "summary": "", "rouge": None,
+              "error": None}
+    try:
+        file_type = FILE_TYPES[os.path.splitext(path)[1].lower()]
+        # documents are already spread over the worker processes
+        text = extract_text(path, file_type, n_jobs=1)
+        record["words"] = len(text.split())
+        record["summary"] = " ".join(
+            summarize_document(text, num, n_jobs=1))
+
+        if reference_path is not None:
+            file_type = FILE_TYPES[os.path.splitext(reference_path)[1]
+                                   .lower()]
+            reference = extract_text(reference_path, file_type, n_jobs=1)
+            record["rouge"] = Rouge().get_scores(record["summary"],
+                                                 reference)[0]
+    except Exception as e:
+        record["error"] = "%s: %s" % (type(e).__name__, e)
+    return record
+
+
+def read_checkpoint(path):
+    """Records of the JSONL checkpoint at `path`"""
+    records = []
+    if not os.path.isfile(path):
+        return records
+    with io.open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # a line cut by an interruption, analyzed again
+                continue
+    return records
+
+
+def write_checkpoint(path, records):
+    """Replaces the JSONL checkpoint at `path` with `records`"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with io.open(fd, encoding="utf-8", mode="w") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@click.command()
+@click.argument("corpus_dir",
+                type=click.Path(exists=True, file_okay=False))
+@click.option("-o", "--output", required=True,
+              type=click.Path(dir_okay=False),
+              help="Output file, .jsonl or .parquet.")
+@click.option("--refs", "refs_dir", default=None,
+              type=click.Path(exists=True, file_okay=False),
+              help="Directory of reference summaries, mirroring "
+                   "CORPUS_DIR, to score the summaries with ROUGE.")
+@click.option("-n", "--num", default=5, show_default=True,
+              help="Number of sentences to extract.")
+@click.option("--format", "output_format", default=None,
+              type=click.Choice(["jsonl", "parquet"]),
+              help="Output format, from the output extension by default.")
+@click.option("-j", "--jobs", default=None, type=int,
+              help="Number of worker processes, all cores by default.")
+@click.option("--resume/--no-resume", default=True, show_default=True,
+              help="Skip documents already analyzed without error in "
+                   "the checkpoint.")
+def main(corpus_dir, output, refs_dir, num, output_format, jobs, resume):
+    """Summarize every pdf/docx/txt document under CORPUS_DIR."""
+    if output_format is None:
+        output_format = "parquet" if output.endswith(".parquet") \
+            else "jsonl"
+    checkpoint = output if output_format == "jsonl" \
+        else output + ".checkpoint.jsonl"
+    if output_format == "parquet":
+        # missing before the run rather than after it
+        import pandas  # noqa: F401
+        import pyarrow  # noqa: F401
+
+    if not resume and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    # failed documents, and lines cut by an interruption, are dropped from
+    # the checkpoint and analyzed again
+    records = [record for record in read_checkpoint(checkpoint)
+               if record.get("error") is None]
+    if os.path.isfile(checkpoint):
+        write_checkpoint(checkpoint, records)
+    done = set(record["path"] for record in records)
+    paths = [p for p in iter_documents(corpus_dir) if p not in done]
+    click.echo("%d documents to analyze, %d already done"
+               % (len(paths), len(done)), err=True)
+
+    with io.open(checkpoint, encoding="utf-8", mode="a") as out, \
+            ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(analyze_file, path, num,
+                            find_reference(path, corpus_dir, refs_dir)
+                            if refs_dir is not None else None)
+            for path in paths
+        ]
+        with click.progressbar(as_completed(futures), length=len(futures),
+                               file=click.get_text_stream("stderr")) as bar:
+            for future in bar:
+                out.write(json.dumps(future.result(), ensure_ascii=False)
+                          + "\n")
+                out.flush()
+
+    if output_format == "parquet":
+        import pandas as pd
+
+        frame = pd.json_normalize(read_checkpoint(checkpoint))
+        frame.to_parquet(output, engine="pyarrow", index=False)
+
+
+if __name__ == "__main__":
+    main()
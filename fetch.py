@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""URL fetching
+
+A `Fetcher` shares one pooled `requests.Session`, bounds every request by
+connect/read timeouts and a maximum body size, keeps an HTTP cache that is
+revalidated with ETag/Last-Modified once entries are older than their TTL,
+and caches the Goose extraction of each fetched page. A `HostLimiter`
+bounds how hard concurrent fetches hit each host.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from goose3 import Goose
+from requests.adapters import HTTPAdapter
+
+from metrics import timed
+
+CachedResponse = namedtuple(
+    "CachedResponse", ("content", "etag", "last_modified", "fetched_at"))
+
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """The response body is over the `max_bytes` of the fetcher"""
+
+
+class Fetcher(object):
+    """
+    Pooled, cached and bounded HTTP fetcher. Safe to share between threads.
+
+    Args:
+      connect_timeout: seconds to wait for the connection
+      read_timeout: seconds to wait between bytes of the response
+      max_bytes: maximum size of a response body
+      ttl: seconds a cached response is used without revalidation
+      max_entries: number of responses and articles kept (LRU)
+      pool_size: connections kept alive per host
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10,
+                 max_bytes=5 << 20, ttl=600, max_entries=128, pool_size=10):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._responses = OrderedDict()
+        self._articles = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def fetch(self, url):
+        """
+        Body of `url`, from the cache while fresh. Stale entries are
+        revalidated with a conditional request when they have validators.
+
+        Raises:
+          requests.exceptions.RequestException: on connection errors,
+            timeouts, HTTP errors and bodies over `max_bytes`
+        """
+        with self._lock:
+            entry = self._responses.get(url)
+        now = time.time()
+        if entry is not None and now - entry.fetched_at < self.ttl:
+            self._store(self._responses, url, entry)
+            return entry.content
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        with self.session.get(url, headers=headers, timeout=self.timeout,
+                              stream=True) as response:
+            if response.status_code == 304 and entry is not None:
+                entry = entry._replace(fetched_at=now)
+                self._store(self._responses, url, entry)
+                return entry.content
+            response.raise_for_status()
+            content = self._read_body(response)
+
+        entry = CachedResponse(content,
+                               response.headers.get("ETag"),
+                               response.headers.get("Last-Modified"),
+                               now)
+        self._store(self._responses, url, entry)
+        return content
+
+    def extract_article(self, url):
+        """Cleaned text of the article at `url`, extracted with Goose"""
+        with timed("fetch"):
+            content = self.fetch(url)
+        key = (url, hashlib.sha256(content).hexdigest())
+        with self._lock:
+            text = self._articles.get(key)
+        if text is None:
+            with timed("goose"):
+                article = self._get_goose().extract(raw_html=content)
+            text = article.cleaned_text
+        self._store(self._articles, key, text)
+        return text
+
+    def _get_goose(self):
+        # Goose instances are not shared between threads
+        goose = getattr(self._local, "goose", None)
+        if goose is None:
+            goose = self._local.goose = Goose()
+        return goose
+
+    def _read_body(self, response):
+        length = response.headers.get("Content-Length")
+        if length is not None and length.isdigit() \
+                and int(length) > self.max_bytes:
+            raise ResponseTooLarge(
+                "Response of %s bytes is over %d bytes"
+                % (length, self.max_bytes), response=response)
+
+        chunks, size = [], 0
+        for chunk in response.iter_content(chunk_size=64 << 10):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise ResponseTooLarge(
+                    "Response is over %d bytes" % self.max_bytes,
+                    response=response)
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _store(self, cache, key, value):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.max_entries:
+                cache.popitem(last=False)
+
+
+class HostLimiter(object):
+    """
+    Per-host rate limit for concurrent fetches: at most `max_per_host`
+    requests in flight per host, started at least `min_interval` seconds
+    apart. Safe to share between threads.
+    """
+
+    def __init__(self, max_per_host=2, min_interval=0.0):
+        self.max_per_host = max_per_host
+        self.min_interval = min_interval
+        self._semaphores = defaultdict(
+            lambda: threading.BoundedSemaphore(self.max_per_host))
+        self._next_start = defaultdict(float)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores[host]
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start[host])
+                self._next_start[host] = start + self.min_interval
+            if start > now:
+                time.sleep(start - now)
+            yield
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""Document ingestion
+
+PDF pages are extracted in ranges on a process pool and streamed back in
+page order, so callers can start working before the whole document is
+parsed, and stop early once they have enough words.
+
+Extracted texts can be kept in an `ExtractionCache`, keyed by the SHA-256
+of the document bytes, so that a known document is never parsed twice.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import docx2txt
+import pdfplumber
+
+PAGES_PER_TASK = 8
+# <sha256 of the bytes>-<sha256 of the kind, truncated>.txt
+_CACHE_FILE = re.compile(r"^[0-9a-f]{64}-[0-9a-f]{16}\.txt$")
+
+_worker_data = None
+
+
+def _read_bytes(file):
+    """Bytes of a path, bytes object or (uploaded) file object"""
+    if isinstance(file, bytes):
+        return file
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            return f.read()
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    file.seek(0)
+    return file.read()
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _extract_pages(start, stop, data=None):
+    """Texts of pages [start, stop[, '' for pages without text. `data` is
+    the PDF bytes or the path of a PDF file"""
+    if data is None:
+        data = _worker_data
+    if isinstance(data, bytes):
+        data = io.BytesIO(data)
+    with pdfplumber.open(data) as pdf:
+        return [page.extract_text() or ""
+                for page in pdf.pages[start:stop]]
+
+
+def iter_pdf_pages(file, max_pages=None, max_words=None, n_jobs=None,
+                   pages_per_task=PAGES_PER_TASK, executor=None):
+    """
+    Yields the text of each page of a PDF, in page order.
+
+    Args:
+      file: path, bytes or file object of the PDF
+      max_pages: only extract the first `max_pages` pages
+      max_words: stop after the page on which the total number of words
+                 reaches `max_words`
+      n_jobs: number of worker processes, all cores if None. Small
+              documents are extracted in-process
+      pages_per_task: number of consecutive pages extracted per task
+      executor: process pool to extract the pages on, shared with other
+                callers and left running, instead of a pool of `n_jobs`
+                workers started for this document. `n_jobs` then only
+                bounds the number of ranges in flight
+    """
+    data = _read_bytes(file)
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        page_count = len(pdf.pages)
+    if max_pages is not None:
+        page_count = min(page_count, max_pages)
+
+    ranges = [(start, min(start + pages_per_task, page_count))
+              for start in range(0, page_count, pages_per_task)]
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+
+    words = 0
+    if len(ranges) <= 1 or (executor is None and n_jobs <= 1):
+        for start, stop in ranges:
+            for text in _extract_pages(start, stop, data):
+                yield text
+                words += len(text.split())
+                if max_words is not None and words >= max_words:
+                    return
+        return
+
+    if executor is None:
+        pool = ProcessPoolExecutor(max_workers=min(n_jobs, len(ranges)),
+                                   initializer=_init_worker,
+                                   initargs=(data,))
+        source = None
+    else:
+        # the workers of a shared pool read the document from a file
+        # instead of receiving it with every task
+        pool = executor
+        fd, source = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    pending = deque()
+    try:
+        # Keep a bounded window of ranges in flight so that an early stop
+        # does not leave the whole document queued
+        ranges = iter(ranges)
+        pending.extend(pool.submit(_extract_pages, start, stop, source)
+                       for start, stop in islice(ranges, 2 * n_jobs))
+        while pending:
+            texts = pending.popleft().result()
+            for start, stop in islice(ranges, 1):
+                pending.append(pool.submit(_extract_pages, start, stop,
+                                           source))
+            for text in texts:
+                yield text
+                words += len(text.split())
+                if max_words is not None and words >= max_words:
+                    return
+    finally:
+        if executor is None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        else:
+            for future in pending:
+                future.cancel()
+            # the results of tasks that could not be cancelled are unused
+            os.remove(source)
+
+
+def read_pdf(file, max_pages=None, max_words=None, n_jobs=None,
+             executor=None):
+    """Text of a PDF, each page preceded by a newline"""
+    pages = iter_pdf_pages(file, max_pages=max_pages, max_words=max_words,
+                           n_jobs=n_jobs, executor=executor)
+    return "".join("\n" + text for text in pages)
+
+
+def extract_text(file, file_type, max_words=None, n_jobs=None,
+                 executor=None):
+    """
+    Text of an uploaded document.
+
+    Args:
+      file: path, bytes or file object of the document
+      file_type: MIME type, "application/pdf" and "text/plain" are
+                 extracted as PDF and utf-8 text, anything else as DOCX
+      max_words: word budget of PDF extraction, see `iter_pdf_pages`
+      n_jobs: worker processes of PDF extraction, see `iter_pdf_pages`
+      executor: shared process pool of PDF extraction, see
+                `iter_pdf_pages`
+    """
+    data = _read_bytes(file)
+    if file_type == "application/pdf":
+        return read_pdf(data, max_words=max_words, n_jobs=n_jobs,
+                        executor=executor)
+    if file_type == "text/plain":
+        return str(data, "utf-8")
+    return docx2txt.process(io.BytesIO(data))
+
+
+class ExtractionCache(object):
+    """
+    LRU cache of extracted texts keyed by the SHA-256 of the document bytes.
+
+    When `directory` is set, extracted texts are also written there and
+    looked up on in-memory misses; the least recently used ones are removed
+    once they take more than `max_disk_bytes`. Other files of the directory
+    are left alone. Safe to share between threads.
+    """
+
+    def __init__(self, max_entries=32, directory=None,
+                 max_disk_bytes=256 << 20):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
+
+    def get_or_extract(self, data, kind, extract):
+        """
+        Returns the cached text of `data` for extraction `kind` (e.g. the
+        MIME type and options), calling `extract(data)` on a miss.
+        """
+        key = "%s-%s" % (hashlib.sha256(data).hexdigest(),
+                         hashlib.sha256(kind.encode("utf-8")).hexdigest()[:16])
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+
+        text = self._read_disk(key)
+        if text is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            text = extract(data)
+            with self._lock:
+                self.misses += 1
+            self._write_disk(key, text)
+
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return text
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".txt")
+
+    def _read_disk(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with io.open(path, encoding="utf-8", newline="") as f:
+                text = f.read()
+            # another process may have evicted the file since it was read
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        return text
+
+    def _write_disk(self, key, text):
+        if self.directory is None:
+            return
+        # written aside and renamed, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".",
+                                        suffix=".tmp")
+        try:
+            with io.open(fd, encoding="utf-8", mode="w", newline="") as f:
+                f.write(text)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        # only the entries of this cache count and are evicted
+        entries = []
+        for name in os.listdir(self.directory):
+            if not _CACHE_FILE.match(name):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""Sparse, vectorized LexRank
+
+Drop-in replacement of sumy's `LexRankSummarizer`: sentences are turned
+into a sparse TF-IDF matrix and the whole idf-modified-cosine similarity
+graph is computed with one sparse matrix product, instead of a pure-Python
+cosine over every pair of sentences. Tokenization, tf/idf weighting,
+thresholding, power iteration and sentence selection follow sumy, so the
+rankings are the same.
+
+`rank_sentences` and `summarize` run it on plain text,
+`hierarchical_summarize` builds a map-reduce summarizer for very long
+documents on top of it, and `summarize_document` picks one or the other.
+"""
+from __future__ import absolute_import, division
+
+import os
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, repeat
+
+import nltk
+import numpy as np
+from scipy import sparse
+from sumy.nlp.tokenizers import Tokenizer
+from sumy.parsers.plaintext import PlaintextParser
+from sumy.summarizers.lex_rank import LexRankSummarizer
+
+
+class SparseLexRankSummarizer(LexRankSummarizer):
+    """
+    LexRank: Graph-based Centrality as Salience in Text Summarization
+    Source: http://tangra.si.umich.edu/~radev/lexrank/lexrank.pdf
+    """
+    # Up to this many sentences the power iteration runs on the dense
+    # matrix, exactly like sumy: sentences that tie mathematically then get
+    # the same rounding, and so the same order, as with sumy
+    dense_power_method_limit = 2000
+
+    def __call__(self, document, sentences_count):
+        ratings = self.rate_sentences(document)
+        if not ratings:
+            return ()
+
+        return self._get_best_sentences(document.sentences, sentences_count,
+                                        ratings)
+
+    def rate_sentences(self, document):
+        """{sentence: LexRank rating} of the sentences of `document`"""
+        sentences_words = [self._to_words_set(s) for s in document.sentences]
+        if not sentences_words:
+            return {}
+
+        matrix = self._create_sparse_matrix(sentences_words, self.threshold)
+        if len(sentences_words) <= self.dense_power_method_limit:
+            scores = LexRankSummarizer.power_method(matrix.toarray(),
+                                                    self.epsilon)
+        else:
+            scores = self.power_method(matrix, self.epsilon)
+        return dict(zip(document.sentences, scores))
+
+    @staticmethod
+    def _create_sparse_matrix(sentences, threshold):
+        """
+        Creates the row-stochastic |sentences|x|sentences| transition matrix
+        of the similarity graph, as a CSR matrix.
+        """
+        vocabulary = {}
+        rows, cols, counts = [], [], []
+        for row, sentence in enumerate(sentences):
+            for term, count in Counter(sentence).items():
+                rows.append(row)
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+
+        sentences_count = len(sentences)
+        shape = (sentences_count, len(vocabulary))
+        tf = sparse.csr_matrix((counts, (rows, cols)), shape=shape,
+                               dtype=np.float64)
+
+        # term frequencies are relative to the most frequent term
+        max_tf = tf.max(axis=1).toarray().ravel()
+        max_tf[max_tf == 0] = 1
+        tf = sparse.diags(1 / max_tf).dot(tf)
+
+        # each (sentence, term) entry is stored once, so the column counts
+        # are the document frequencies
+        n_j = np.bincount(cols, minlength=len(vocabulary))
+        idf = np.log(sentences_count / (1 + n_j))
+        tf_idf = tf.dot(sparse.diags(idf)).tocsr()
+
+        norms = np.sqrt(np.asarray(tf_idf.multiply(tf_idf).sum(axis=1)))
+        norms = norms.ravel()
+        norms[norms == 0] = 1
+        unit = sparse.diags(1 / norms).dot(tf_idf)
+        similarity = unit.dot(unit.T).tocsr()
+
+        adjacency = (similarity > threshold).astype(np.float64)
+        degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+        degrees[degrees == 0] = 1
+        return sparse.diags(1 / degrees).dot(adjacency).tocsr()
+
+    @staticmethod
+    def power_method(matrix, epsilon):
+        transposed_matrix = matrix.T.tocsr()
+        sentences_count = matrix.shape[0]
+        p_vector = np.full(sentences_count, 1.0 / sentences_count)
+        lambda_val = 1.0
+
+        while lambda_val > epsilon:
+            next_p = transposed_matrix.dot(p_vector)
+            next_p /= np.linalg.norm(next_p)
+            lambda_val = np.linalg.norm(next_p - p_vector)
+            p_vector = next_p
+
+        return p_vector
+
+
+@lru_cache(maxsize=None)
+def ensure_punkt():
+    """Looks the NLTK punkt models up locally, once per process, and only
+    downloads them when they are missing. Raises LookupError when the
+    download fails, which is not cached, so the next call tries again."""
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        # nltk.download reports failures by returning False
+        if not nltk.download("punkt", quiet=True):
+            raise LookupError("The NLTK punkt models could not be "
+                              "downloaded")
+
+
+@lru_cache(maxsize=None)
+def _get_summarizer(language):
+    """Tokenizer and summarizer, kept alive per (worker) process"""
+    ensure_punkt()
+    return Tokenizer(language), SparseLexRankSummarizer()
+
+
+def rank_sentences(text, language="english"):
+    """(order, sentence) pairs of the sentences of `text`, best LexRank
+    rating first"""
+    tokenizer, summarizer = _get_summarizer(language)
+    document = PlaintextParser.from_string(text, tokenizer).document
+    ratings = summarizer.rate_sentences(document)
+    # stable, like sumy: equally rated sentences stay in document order
+    ranking = sorted(enumerate(document.sentences),
+                     key=lambda item: ratings[item[1]], reverse=True)
+    return [(order, str(sentence)) for order, sentence in ranking]
+
+
+def top_sentences(ranking, num):
+    """The `num` best sentences of a `rank_sentences` ranking, in document
+    order"""
+    return [sentence for _, sentence in sorted(ranking[:num])]
+
+
+def summarize(text, num, language="english"):
+    """The `num` best LexRank sentences of `text`, in document order"""
+    return top_sentences(rank_sentences(text, language), num)
+
+
+def split_sections(sentences, chunk_size=2000, overlap=200):
+    """
+    Groups consecutive sentences into sections of at least `chunk_size`
+    words (or the remaining sentences). Each section starts again with the
+    last sentences of the previous one, up to `overlap` words.
+    """
+    lengths = [len(sentence.split()) for sentence in sentences]
+    sections = []
+    start = 0
+    while start < len(sentences):
+        end, words = start, 0
+        while end < len(sentences) and (words < chunk_size or end == start):
+            words += lengths[end]
+            end += 1
+        sections.append(sentences[start:end])
+        if end == len(sentences):
+            break
+
+        next_start, words = end, 0
+        while (next_start - 1 > start
+               and words + lengths[next_start - 1] <= overlap):
+            next_start -= 1
+            words += lengths[next_start]
+        start = next_start
+    return sections
+
+
+def hierarchical_summarize(text, num, language="english", chunk_size=2000,
+                           overlap=200, n_jobs=None, executor=None):
+    """
+    Map-reduce LexRank for long documents: the text is split into sections
+    of about `chunk_size` words (see `split_sections`), each section is
+    summarized to `num` sentences on a process pool, and a final LexRank
+    pass over the section summaries picks the `num` output sentences. Work
+    grows linearly with the number of sections instead of quadratically
+    with the number of sentences.
+
+    Args:
+      text: document to summarize
+      num: number of sentences to extract
+      language: language of the sumy tokenizer
+      chunk_size: minimum number of words per section
+      overlap: words of the previous section repeated at a section start
+      n_jobs: number of worker processes, all cores if None
+      executor: process pool to summarize the sections on, shared with
+                other callers and left running, instead of a pool of
+                `n_jobs` workers started for this document
+
+    Returns:
+      list of the summary sentences, in document order
+    """
+    tokenizer, _ = _get_summarizer(language)
+    sentences = [str(s) for s in tokenizer.to_sentences(text)]
+    sections = split_sections(sentences, chunk_size=chunk_size,
+                              overlap=overlap)
+    if len(sections) <= 1:
+        return summarize(text, num, language)
+
+    section_texts = [" ".join(section) for section in sections]
+    args = (section_texts, repeat(num), repeat(language))
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if executor is not None:
+        summaries = list(executor.map(summarize, *args))
+    elif n_jobs <= 1:
+        summaries = list(map(summarize, *args))
+    else:
+        max_workers = min(n_jobs, len(sections))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            summaries = list(executor.map(summarize, *args))
+
+    # overlapping sections may pick the same sentence twice
+    candidates = list(OrderedDict.fromkeys(chain.from_iterable(summaries)))
+    return summarize(" ".join(candidates), num, language)
+
+
+def summarize_document(text, num, language="english", chunk_size=2000,
+                       overlap=200, n_jobs=None, executor=None):
+    """
+    `summarize` for texts of up to `chunk_size` words and
+    `hierarchical_summarize` for longer ones.
+    """
+    if len(text.split()) > chunk_size:
+        return hierarchical_summarize(text, num, language=language,
+                                      chunk_size=chunk_size,
+                                      overlap=overlap, n_jobs=n_jobs,
+                                      executor=executor)
+    return summarize(text, num, language)
@@ -1,68 +1,175 @@
+import os
+
 import streamlit as st
 from streamlit_option_menu import option_menu
 
-from sumy.summarizers.lex_rank import LexRankSummarizer
-from sumy.nlp.tokenizers import Tokenizer
-from sumy.parsers.plaintext import PlaintextParser
+from metrics import REGISTRY, collect, format_profile, profile, timed
+from analysis import Analysis, WordCloudRenderer, count_words, top_words
 
-from collections import Counter
+# Streamlit runs this script again on every interaction, so the heavy
+# dependencies (sumy, pdfplumber, goose3, ...) are only imported by the
+# functions and pages that use them
 
-import pandas as pd
-import altair as alt
-import matplotlib.pyplot as plt
-import neattext.functions as nfx
-from wordcloud import WordCloud
+WORD_LIMIT = 50000
+# Every stage timing is also appended to this JSON lines file when set
+REGISTRY.path = os.environ.get("ANALYZER_METRICS_PATH")
 
-import pdfplumber
-import docx2txt
+# The LexRank ranking of a text does not depend on the number of sentences
+# picked, so moving the slider does not rank the sentences again
+@st.experimental_memo(max_entries=64)
+def rank_sentences(docx):
+    """(order, sentence) pairs of `docx`, best LexRank rating first"""
+    import lexrank
 
-from rouge import Rouge
+    with timed("lexrank"):
+        return lexrank.rank_sentences(docx)
 
-from goose3 import Goose
-from requests import get
+def sumy_summarizer(docx, num):
+    from lexrank import top_sentences
 
-import validators
+    summary_list = top_sentences(rank_sentences(docx), num)
+    result = ' '.join(summary_list)
+    return result
 
-import nltk
-nltk.download('punkt')
+# Long documents are summarized section by section, on the process pool
+@st.experimental_memo(max_entries=64)
+def document_summarizer(docx, num):
+    from lexrank import summarize_document
 
-def sumy_summarizer(docx, num):
-    parser = PlaintextParser.from_string(docx, Tokenizer("english"))
-    lex_summarizer = LexRankSummarizer()
-    summary = lex_summarizer(parser.document, num)
-    summary_list = [str(sentence) for sentence in summary]
+    with timed("lexrank"):
+        summary_list = summarize_document(docx, num,
+                                          executor=get_process_pool())
     result = ' '.join(summary_list)
     return result
 
-def plot_worldcloud(docx):
-    myworldcloud = WordCloud().generate(docx)
-    fig = plt.figure(figsize=(20, 10))
-    plt.imshow(myworldcloud, interpolation='bilinear')
-    plt.axis('off')
-    st.pyplot(fig)
-
-def plot_word_freq(docx, num=10):
-    word_freq = Counter(docx.split())
-    most_common_tokens = dict(word_freq.most_common(num))
+# One worker pool per server process, shared by all sessions. The server is
+# multi-threaded, so workers are started by a forkserver (or spawned where
+# there is none) instead of being forked from it
+@st.experimental_singleton
+def get_process_pool():
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                               mp_context=context)
+
+@st.experimental_singleton
+def get_extraction_cache():
+    from ingest import ExtractionCache
+
+    return ExtractionCache(max_entries=32)
+
+def read_upload(text_file):
+    from ingest import extract_text
+
+    def extract(data):
+        # extraction of pdfs stops once the document is known to be too long
+        with timed("extract"):
+            return extract_text(data, text_file.type, max_words=WORD_LIMIT,
+                                executor=get_process_pool())
+    return get_extraction_cache().get_or_extract(
+        text_file.getvalue(), "{}:{}".format(text_file.type, WORD_LIMIT),
+        extract)
+
+@st.experimental_singleton
+def get_fetcher():
+    from fetch import Fetcher
+
+    return Fetcher()
+
+# The word-frequency index is memoized by a hash of the tokens and shared by
+# the bar chart and the word cloud
+@st.experimental_memo(max_entries=64)
+def word_frequencies(tokens):
+    return count_words(tokens)
+
+# Word clouds are rendered straight to PNG, no matplotlib figure is kept
+# around, and the images are shared by all sessions
+@st.experimental_singleton
+def get_wordcloud_renderer():
+    return WordCloudRenderer(width=1000, height=500, max_entries=32)
+
+def plot_worldcloud(wordcloud):
+    st.image(wordcloud.png, use_column_width=True)
+    st.caption("Rendered in {:.0f} ms{}".format(
+        wordcloud.seconds * 1000, " (cached)" if wordcloud.cached else ""))
+
+def plot_word_freq(word_freq, num=10):
+    import altair as alt
+    import pandas as pd
+
+    most_common_tokens = dict(top_words(word_freq, num))
     word_freq_df = pd.DataFrame({'Tokens': most_common_tokens.keys(), 'Counts': most_common_tokens.values()})
     c = alt.Chart(word_freq_df).mark_bar().encode(
         x='Tokens', y='Counts')
     st.altair_chart(c, use_container_width=True)
 
-def read_pdf2(file):
-    all_text = ""
-    with pdfplumber.open(file) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            all_text += '\n' + text
-        return all_text
+def check_word_limit(analysis, col):
+    count = analysis.word_count
+    col.caption("Words at present:  {} /{}".format(count, WORD_LIMIT))
+    if count < WORD_LIMIT:
+        return True
+    st.warning("Words are more than {}. Subscribe to Text Article Analyzer PRO".format(WORD_LIMIT))
+    return False
+
+def show_analysis(analysis):
+    # Stages are computed lazily, each one inside the expander showing it
+    try:
+        with st.expander("Original Text"):
+            st.write(analysis.text)
+
+        with st.expander("LexRank"):
+            st.write(analysis.summary)
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            with st.expander("Word Cloud"):
+                try:
+                    plot_worldcloud(analysis.wordcloud)
+                except:
+                    st.warning("Insufficient Data")
+        with col2:
+            with st.expander("Word Frequency"):
+                plot_word_freq(analysis.frequencies)
+    except:
+        st.warning("Insufficient Data")
+
+@st.experimental_singleton
+def get_rouge():
+    from rouge import Rouge
+
+    return Rouge()
 
+# Scores are memoized by a hash of the (summary, reference) contents, shared
+# by all sessions and evicted least recently used first
+@st.experimental_memo(max_entries=256)
 def evaluate_summary(summary,reference):
-    r = Rouge()
-    eval_score = r.get_scores(summary, reference)
+    import pandas as pd
+
+    with timed("rouge"):
+        eval_score = get_rouge().get_scores(summary, reference)
     eval_score_df = pd.DataFrame(eval_score[0])
     return eval_score_df
 
+def show_debug_panel(trace, profiler):
+    import pandas as pd
+
+    st.sidebar.subheader("Stage timings")
+    if trace:
+        st.sidebar.dataframe(pd.DataFrame(
+            [{'Stage': stage, 'ms': round(seconds * 1000, 1)} for stage, seconds in trace]))
+    else:
+        st.sidebar.caption("No stage ran")
+    with st.sidebar.expander("All runs (Prometheus)"):
+        st.code(REGISTRY.to_prometheus())
+    if profiler is not None:
+        with st.expander("Profile"):
+            st.text(format_profile(profiler))
+
 def main():
     st.set_page_config(
         layout="wide",
@@ -87,6 +194,15 @@ def main():
         selected = option_menu("Methods", ["Raw_Text", 'File', 'URL', 'Upgrade to Text Article Analyzer PRO'],
                                icons=['pencil', 'folder', 'link','book', 'diamond'], menu_icon="cast", default_index=0)
 
+    # Opt-in debug panel with the timings of the run, open the app with ?debug
+    debug = "debug" in st.experimental_get_query_params()
+    profiling = debug and st.sidebar.checkbox("Profile this run")
+    with collect() as trace, profile(profiling) as profiler:
+        show_page(selected)
+    if debug:
+        show_debug_panel(trace, profiler)
+
+def show_page(selected):
 # _______________________________________________________________________________________________________________________________
     if selected == "Raw_Text":
         st.markdown("<h1 style='text-align: center;'>Text Article Analyzer</h1>", unsafe_allow_html=True)
@@ -97,34 +213,10 @@ def main():
 
         raw_text = st.text_area("Enter Text Here", height=120)
         col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
-        count = len(raw_text.split())
-        col1.caption("Words at present:  {} /1000".format(count))
-        if count < 1000:
+        analysis = Analysis(raw_text, num, sumy_summarizer, word_frequencies, get_wordcloud_renderer())
+        if check_word_limit(analysis, col1):
             if col7.button("Summarize"):
-                try:
-                    processed_text = nfx.remove_stopwords(raw_text)
-                    with st.expander("Original Text"):
-                        st.write(raw_text)
-
-                    with st.expander("LexRank"):
-                        my_summary = sumy_summarizer(raw_text, num)
-                        st.write(my_summary)
-
-                    col1, col2 = st.columns(2)
-
-                    with col1:
-                        with st.expander("Word Cloud"):
-                            try:
-                                plot_worldcloud(processed_text)
-                            except:
-                                st.warning("Insufficient Data")
-                    with col2:
-                        with st.expander("Word Frequency"):
-                            plot_word_freq(processed_text)
-                except:
-                    st.warning("Insufficient Data")
-        else:
-            st.error("Words are more than 1000. Subscribe to Text Article Analyzer PRO")
+                show_analysis(analysis)
 
 # _______________________________________________________________________________________________________________________________
     elif selected == "File":
@@ -136,99 +228,18 @@ def main():
         text_file = st.file_uploader("Upload Document", type=["pdf", "docx", "txt"])
         col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
         if text_file is not None:
-
-            if text_file.type == 'application/pdf':
-                raw_text = read_pdf2(text_file)
-                count = len(raw_text.split())
-                col1.caption("Words at present:  {} /1000".format(count))
-                if count < 1000:
-                    if col7.button("Summarize"):
-                        try:
-                            processed_text = nfx.remove_stopwords(raw_text)
-                            with st.expander("Original Text"):
-                                st.write(raw_text)
-
-                            with st.expander("LexRank"):
-                                my_summary = sumy_summarizer(raw_text, num)
-                                st.write(my_summary)
-
-                            col1, col2 = st.columns(2)
-
-                            with col1:
-                                with st.expander("Word Cloud"):
-                                    try:
-                                        plot_worldcloud(processed_text)
-                                    except:
-                                        st.warning("Insufficient Data")
-                            with col2:
-                                with st.expander("Word Frequency"):
-                                    plot_word_freq(processed_text)
-                        except:
-                            st.warning("Insufficient Data")
-                else:
-                    st.warning("Words are more than 1000. Subscribe to Text Article Analyzer PRO")
-            elif text_file.type == 'text/plain':
-                raw_text = str(text_file.read(), "utf-8")
-                count = len(raw_text.split())
-                col1.caption("Words at present:  {} /1000".format(count))
-                if count < 1000:
-                    if col7.button("Summarize"):
-                        try:
-                            processed_text = nfx.remove_stopwords(raw_text)
-                            with st.expander("Original Text"):
-                                st.write(raw_text)
-
-                            with st.expander("LexRank"):
-                                my_summary = sumy_summarizer(raw_text, num)
-                                st.write(my_summary)
-
-                            col1, col2 = st.columns(2)
-
-                            with col1:
-                                with st.expander("Word Cloud"):
-                                    try:
-                                        plot_worldcloud(processed_text)
-                                    except:
-                                        st.warning("Insufficient Data")
-                            with col2:
-                                with st.expander("Word Frequency"):
-                                    plot_word_freq(processed_text)
-                        except:
-                            st.warning("Insufficient Data")
-                else:
-                    st.warning("Words are more than 1000. Subscribe to Text Article Analyzer PRO")
-            else:
-                raw_text = docx2txt.process(text_file)
-                count = len(raw_text.split())
-                col1.caption("Words at present:  {} /1000".format(count))
-                if count < 1000:
-                    if col7.button("Summarize"):
-                        try:
-                            processed_text = nfx.remove_stopwords(raw_text)
-                            with st.expander("Original Text"):
-                                st.write(raw_text)
-
-                            with st.expander("LexRank"):
-                                my_summary = sumy_summarizer(raw_text, num)
-                                st.write(my_summary)
-
-                            col1, col2 = st.columns(2)
-
-                            with col1:
-                                with st.expander("Word Cloud"):
-                                    try:
-                                        plot_worldcloud(processed_text)
-                                    except:
-                                        st.warning("Insufficient Data")
-                            with col2:
-                                with st.expander("Word Frequency"):
-                                    plot_word_freq(processed_text)
-                        except:
-                            st.warning("Insufficient Data")
-                else:
-                    st.warning("Words are more than 1000. Subscribe to Text Article Analyzer PRO")
+            raw_text = read_upload(text_file)
+            analysis = Analysis(raw_text, num, document_summarizer, word_frequencies, get_wordcloud_renderer())
+            if check_word_limit(analysis, col1):
+                if col7.button("Summarize"):
+                    show_analysis(analysis)
 # _______________________________________________________________________________________________________________________________
     elif selected == "URL":
+        import pandas as pd
+        import validators
+        from requests.exceptions import RequestException
+        from batch import analyze_urls
+
         st.markdown("<h1 style='text-align: center;'>Text Article Analyzer</h1>", unsafe_allow_html=True)
         st.subheader("Uniform Resource Locator (URL)")
 
@@ -240,39 +251,45 @@ def main():
         if col7.button("Summarize"):
             valid = validators.url(url)
             if valid == True:
-                response = get(url)
-                extractor = Goose()
-                article = extractor.extract(raw_html=response.content)
-                raw_text = article.cleaned_text
-
-                count = len(raw_text.split())
-                col1.caption("Words at present:  {} /1000".format(count))
-                if count < 1000:
-                    processed_text = nfx.remove_stopwords(raw_text)
-                    with st.expander("Original Text"):
-                        st.write(raw_text)
-
-                    with st.expander("LexRank"):
-                        my_summary = sumy_summarizer(raw_text,num)
-                        st.write(my_summary)
-
-                    col1, col2 = st.columns(2)
-
-                    with col1:
-                        with st.expander("Word Cloud"):
-                            try:
-                                plot_worldcloud(processed_text)
-                            except:
-                                st.warning("Insufficient Data")
-                    with col2:
-                        with st.expander("Word Frequency"):
-                            plot_word_freq(processed_text)
+                try:
+                    raw_text = get_fetcher().extract_article(url)
+                except RequestException:
+                    # the batch form below is still shown
+                    st.warning("Could not fetch the URL")
                 else:
-                    st.warning("Words are more than 1000. Subscribe to Text Article Analyzer PRO")
+                    analysis = Analysis(raw_text, num, sumy_summarizer, word_frequencies, get_wordcloud_renderer())
+                    if check_word_limit(analysis, col1):
+                        show_analysis(analysis)
             else:
                 st.warning("Not a Valid URL")
+
+        st.subheader("Batch of URLs")
+        urls_text = st.text_area("Enter URLs here, one per line:", height=120)
+        urls_file = st.file_uploader("Or upload a list of URLs", type=["txt"])
+        col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
+
+        if col7.button("Summarize all"):
+            lines = urls_text.splitlines()
+            if urls_file is not None:
+                lines += str(urls_file.getvalue(), "utf-8").splitlines()
+            urls = list(dict.fromkeys(line.strip() for line in lines if line.strip()))
+            valid_urls = [u for u in urls if validators.url(u) == True]
+            rows = [{"url": u, "words": 0, "summary": "", "error": "Not a Valid URL"}
+                    for u in urls if u not in valid_urls]
+
+            col1.caption("URLs done:  {} /{}".format(len(rows), len(urls)))
+            table = st.empty()
+            if rows:
+                table.dataframe(pd.DataFrame(rows))
+            for row in analyze_urls(valid_urls, num, get_fetcher(),
+                                    executor=get_process_pool()):
+                rows.append(row)
+                col1.caption("URLs done:  {} /{}".format(len(rows), len(urls)))
+                table.dataframe(pd.DataFrame(rows))
 # _______________________________________________________________________________________________________________________________
     elif selected == "Evaluate_Summary":
+        import altair as alt
+
         st.markdown("<h1 style='text-align: center;'>Text Article Analyzer</h1>", unsafe_allow_html=True)
         st.subheader("Rouge Score Metrics")
 
@@ -287,14 +304,13 @@ def main():
         col1, col2, col3, col4, col5, col6, col7, col8 = st.columns(8)
         if col8.button("Evaluate"):
             try:
+                score = evaluate_summary(my_summary, raw_text)
                 col1, col2 = st.columns(2)
                 with col1:
                     with st.expander("Rouge Score"):
-                        score = evaluate_summary(my_summary, raw_text)
                         st.write(score.T)
                 with col2:
                     with st.expander("Rouge Score Graph"):
-                        score = evaluate_summary(my_summary, raw_text)
                         score['metrics'] = score.index
                         c = alt.Chart(score).mark_bar().encode(
                             x= 'rouge-1', y='metrics'
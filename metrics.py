@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Stage timings
+
+`timed` measures a stage, as a context manager or a decorator, and records
+its duration in a `MetricsRegistry`: a count, sum and maximum per stage,
+dumped in the Prometheus text format, and optionally every observation
+appended to a JSON lines file. Timings of the current thread can also be
+collected into a trace, e.g. the breakdown of one Streamlit run, and a run
+can be profiled with cProfile.
+"""
+from __future__ import absolute_import
+
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ContextDecorator, contextmanager
+
+
+class MetricsRegistry(object):
+    """
+    Count, sum and maximum of the durations of every stage. Safe to share
+    between threads.
+
+    Args:
+      path: JSON lines file every observation is appended to, if set
+      prefix: prefix of the Prometheus metric names
+    """
+
+    def __init__(self, path=None, prefix="analyzer"):
+        self.path = path
+        self.prefix = prefix
+        self._stages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            count, total, peak = self._stages.get(stage, (0, 0.0, 0.0))
+            self._stages[stage] = (count + 1, total + seconds,
+                                   max(peak, seconds))
+            if self.path is not None:
+                with io.open(self.path, encoding="utf-8", mode="a") as f:
+                    f.write(json.dumps({"time": time.time(), "stage": stage,
+                                        "seconds": seconds}) + "\n")
+
+    def stats(self):
+        """{stage: (count, total seconds, maximum seconds)}"""
+        with self._lock:
+            return OrderedDict(self._stages)
+
+    def to_prometheus(self):
+        """The registry in the Prometheus text exposition format"""
+        name = "%s_stage_seconds" % self.prefix
+        lines = [
+            "# HELP %s Time spent in each analysis stage." % name,
+            "# TYPE %s summary" % name,
+        ]
+        stats = self.stats()
+        for stage, (count, total, _) in stats.items():
+            labels = '{stage="%s"}' % _escape_label(stage)
+            lines.append("%s_count%s %d" % (name, labels, count))
+            lines.append("%s_sum%s %r" % (name, labels, total))
+        lines += [
+            "# HELP %s_max Longest run of each analysis stage." % name,
+            "# TYPE %s_max gauge" % name,
+        ]
+        for stage, (_, _, peak) in stats.items():
+            lines.append('%s_max{stage="%s"} %r'
+                         % (name, _escape_label(stage), peak))
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry()
+
+_local = threading.local()
+
+
+class timed(ContextDecorator):
+    """
+    Times `stage` into `registry` (the module one by default) and the
+    traces collected by the current thread.
+
+        with timed("goose"):
+            ...
+
+        @timed("lexrank")
+        def summarize(...):
+            ...
+    """
+
+    def __init__(self, stage, registry=None):
+        self.stage = stage
+        self.registry = registry
+
+    def _recreate_cm(self):
+        # a fresh timer per decorated call, so calls from several threads
+        # or recursive calls do not share their start time
+        return type(self)(self.stage, self.registry)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        (self.registry or REGISTRY).observe(self.stage, seconds)
+        for trace in getattr(_local, "traces", ()):
+            trace.append((self.stage, seconds))
+        return False
+
+
+@contextmanager
+def collect():
+    """Collects the (stage, seconds) timings of the current thread into
+    the list it yields"""
+    trace = []
+    traces = _local.__dict__.setdefault("traces", [])
+    traces.append(trace)
+    try:
+        yield trace
+    finally:
+        traces.remove(trace)
+
+
+@contextmanager
+def profile(enabled=True):
+    """Profiles the block with cProfile when `enabled`, yielding the
+    `cProfile.Profile` (None when disabled)"""
+    if not enabled:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+
+
+def format_profile(profiler, limit=30, sort="cumulative"):
+    """The `limit` top functions of `profiler` as text"""
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -3,7 +3,9 @@ from __future__ import absolute_import
 import six
 import rouge_score as rouge_score
 import io
+import itertools
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 
 class FilesRouge:
@@ -27,14 +29,31 @@ class FilesRouge:
         ref_lc = line_count(ref_path)
         assert(hyp_lc == ref_lc)
 
-    def get_scores(self, hyp_path, ref_path, avg=False, ignore_empty=False):
+    def get_scores(self, hyp_path, ref_path, avg=False, ignore_empty=False,
+                   n_jobs=None, chunksize=None, stream=False):
         """Calculate ROUGE scores between each pair of
         lines (hyp_file[i], ref_file[i]).
         Args:
           * hyp_path: hypothesis file path
           * ref_path: references file path
           * avg (False): whether to get an average scores or a list
+          * n_jobs (None): number of worker processes, see `Rouge.get_scores`
+          * chunksize (None): pairs per chunk, see `Rouge.get_scores`
+          * stream (False): read both files lazily instead of loading them.
+                            Returns an iterator of scores (see `iter_scores`)
+                            or, with `avg`, running averages over chunks of
+                            `chunksize` lines (same values as with `n_jobs`).
+                            Not compatible with `n_jobs`
         """
+        if stream:
+            if n_jobs is not None:
+                raise ValueError("n_jobs is not supported when streaming")
+            if not avg:
+                return self.iter_scores(hyp_path, ref_path,
+                                        ignore_empty=ignore_empty)
+            return self._get_stream_avg_scores(hyp_path, ref_path,
+                                               ignore_empty, chunksize)
+
         self._check_files(hyp_path, ref_path)
 
         with io.open(hyp_path, encoding="utf-8", mode="r") as hyp_file:
@@ -44,7 +63,53 @@ class FilesRouge:
             refs = [line[:-1] for line in ref_file]
 
         return self.rouge.get_scores(hyps, refs, avg=avg,
-                                     ignore_empty=ignore_empty)
+                                     ignore_empty=ignore_empty,
+                                     n_jobs=n_jobs, chunksize=chunksize)
+
+    def iter_scores(self, hyp_path, ref_path, ignore_empty=False):
+        """Lazily yield ROUGE scores for each pair of lines
+        (hyp_file[i], ref_file[i]), reading both files in lockstep.
+        Raises ValueError as soon as one file ends before the other.
+        """
+        for hyp, ref in self._iter_pairs(hyp_path, ref_path, ignore_empty):
+            yield self.rouge._get_scores([hyp], [ref])[0]
+
+    def _iter_pairs(self, hyp_path, ref_path, ignore_empty):
+        assert(os.path.isfile(hyp_path))
+        assert(os.path.isfile(ref_path))
+
+        with io.open(hyp_path, encoding="utf-8", mode="r") as hyp_file, \
+                io.open(ref_path, encoding="utf-8", mode="r") as ref_file:
+            lines = itertools.zip_longest(hyp_file, ref_file)
+            for line_number, (hyp, ref) in enumerate(lines, 1):
+                if hyp is None or ref is None:
+                    raise ValueError(
+                        "Line count mismatch: '%s' ends at line %d" %
+                        (hyp_path if hyp is None else ref_path,
+                         line_number - 1))
+
+                hyp, ref = hyp[:-1], ref[:-1]
+                if ignore_empty and (len(hyp) == 0 or len(ref) == 0):
+                    continue
+                yield hyp, ref
+
+    def _get_stream_avg_scores(self, hyp_path, ref_path, ignore_empty,
+                               chunksize):
+        if chunksize is None:
+            chunksize = Rouge.DEFAULT_CHUNKSIZE
+
+        rouge = self.rouge
+        pairs = self._iter_pairs(hyp_path, ref_path, ignore_empty)
+        scores, count = rouge._get_zero_scores(), 0
+        while True:
+            chunk = list(itertools.islice(pairs, chunksize))
+            if len(chunk) == 0:
+                break
+            hyps, refs = zip(*chunk)
+            chunk_scores, chunk_count = rouge._get_sum_scores(hyps, refs)
+            scores = rouge._add_scores(scores, chunk_scores)
+            count += chunk_count
+        return rouge._divide_scores(scores, count)
 
 
 class Rouge:
@@ -58,15 +123,61 @@ class Rouge:
         "rouge-l": lambda hyp, ref, **k:
             rouge_score.rouge_l_summary_level(hyp, ref, **k),
     }
+    AVAILABLE_MULTI_METRICS = {
+        "rouge-1": lambda seqs, ids, **k:
+            rouge_score.multi_rouge_n(seqs, ids, 1, **k),
+        "rouge-2": lambda seqs, ids, **k:
+            rouge_score.multi_rouge_n(seqs, ids, 2, **k),
+        "rouge-3": lambda seqs, ids, **k:
+            rouge_score.multi_rouge_n(seqs, ids, 3, **k),
+        "rouge-4": lambda seqs, ids, **k:
+            rouge_score.multi_rouge_n(seqs, ids, 4, **k),
+        "rouge-5": lambda seqs, ids, **k:
+            rouge_score.multi_rouge_n(seqs, ids, 5, **k),
+        "rouge-l": lambda seqs, ids, **k:
+            rouge_score.multi_rouge_l(seqs, ids, **k),
+    }
+    # ROUGE-N of whole batches of pairs, for the "numpy" backend
+    AVAILABLE_BATCH_METRICS = {
+        "rouge-1": lambda hyps, refs, **k:
+            rouge_score.batch_rouge_n(hyps, refs, 1, **k),
+        "rouge-2": lambda hyps, refs, **k:
+            rouge_score.batch_rouge_n(hyps, refs, 2, **k),
+        "rouge-3": lambda hyps, refs, **k:
+            rouge_score.batch_rouge_n(hyps, refs, 3, **k),
+        "rouge-4": lambda hyps, refs, **k:
+            rouge_score.batch_rouge_n(hyps, refs, 4, **k),
+        "rouge-5": lambda hyps, refs, **k:
+            rouge_score.batch_rouge_n(hyps, refs, 5, **k),
+    }
     DEFAULT_STATS = ["recall", "precision", "f-1"]
     AVAILABLE_STATS = ["recall", "precision", "f-1"]
+    AVAILABLE_MULTI_REF_AGGS = ["max", "mean"]
+    # "python" scores pair by pair, "numpy" computes ROUGE-N of batches of
+    # `DEFAULT_CHUNKSIZE` pairs at once with `rouge_score.batch_rouge_n`.
+    # Texts are still split and interned in Python, which bounds the
+    # speedup, and ROUGE-L is scored pair by pair with either backend; see
+    # benchmarks/bench_rouge.py for the measured speedup
+    AVAILABLE_BACKENDS = ["python", "numpy"]
+    DEFAULT_CHUNKSIZE = 1000
+    BOOTSTRAP_BATCH_CELLS = 1 << 22
 
     def __init__(self, metrics=None, stats=None, return_lengths=False,
-                 raw_results=False, exclusive=True):
+                 raw_results=False, exclusive=True, multi_ref_agg="max",
+                 backend="python"):
         self.return_lengths = return_lengths
         self.raw_results = raw_results
         self.exclusive = exclusive
 
+        self.backend = backend.lower()
+        if self.backend not in Rouge.AVAILABLE_BACKENDS:
+            raise ValueError("Unknown backend '%s'" % backend)
+
+        self.multi_ref_agg = multi_ref_agg.lower()
+        if self.multi_ref_agg not in Rouge.AVAILABLE_MULTI_REF_AGGS:
+            raise ValueError("Unknown multi-reference aggregation '%s'"
+                             % multi_ref_agg)
+
         if metrics is not None:
             self.metrics = [m.lower() for m in metrics]
 
@@ -88,11 +199,38 @@ class Rouge:
             else:
                 self.stats = Rouge.DEFAULT_STATS
 
-    def get_scores(self, hyps, refs, avg=False, ignore_empty=False):
-        if isinstance(hyps, six.string_types):
+    def get_scores(self, hyps, refs, avg=False, ignore_empty=False,
+                   n_jobs=None, chunksize=None):
+        """Calculate ROUGE scores between each pair (hyps[i], refs[i]).
+        Args:
+          * hyps: hypothesis text(s), either raw strings or
+                  `rouge_score.PreparedText` (tokenized once and reused by
+                  every metric; the texts of a pair must share one
+                  `rouge_score.TokenVocabulary`)
+          * refs: reference text(s), same types as `hyps`. A list of texts
+                  in place of a reference scores the hypothesis against
+                  each of them (tokenizing the hypothesis once) and
+                  aggregates with `multi_ref_agg`: "max" keeps the scores
+                  of the reference with the best f-1 (overlap with
+                  `raw_results`), "mean" averages them
+          * avg (False): whether to get an average scores or a list
+          * n_jobs (None): number of worker processes (-1 for all cores).
+                           Pairs are split into chunks of `chunksize` and
+                           averages are reduced from per-chunk sums in chunk
+                           order, so results do not depend on `n_jobs`.
+                           None scores serially without chunking
+          * chunksize (None): pairs per chunk, `DEFAULT_CHUNKSIZE` if None
+        """
+        if isinstance(hyps, (six.string_types, rouge_score.PreparedText)):
             hyps, refs = [hyps], [refs]
 
         if ignore_empty:
+            # Filter out empty references of multi-reference pairs
+            refs = type(refs)(
+                [_ for _ in ref if len(_) > 0]
+                if isinstance(ref, (list, tuple)) else ref
+                for ref in refs)
+
             # Filter out hyps of 0 length
             hyps_and_refs = zip(hyps, refs)
             hyps_and_refs = [_ for _ in hyps_and_refs
@@ -103,56 +241,286 @@ class Rouge:
         assert(isinstance(hyps, type(refs)))
         assert(len(hyps) == len(refs))
 
+        if n_jobs is not None:
+            return self._get_chunked_scores(hyps, refs, avg, n_jobs,
+                                            chunksize)
         if not avg:
             return self._get_scores(hyps, refs)
         return self._get_avg_scores(hyps, refs)
 
-    def _get_scores(self, hyps, refs):
-        scores = []
+    def _get_chunked_scores(self, hyps, refs, avg, n_jobs, chunksize):
+        if chunksize is None:
+            chunksize = Rouge.DEFAULT_CHUNKSIZE
+        if n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+
+        starts = range(0, len(hyps), chunksize)
+        hyp_chunks = [hyps[i:i + chunksize] for i in starts]
+        ref_chunks = [refs[i:i + chunksize] for i in starts]
+        args = (itertools.repeat(self), hyp_chunks, ref_chunks,
+                itertools.repeat(avg))
+
+        if n_jobs <= 1 or len(hyp_chunks) <= 1:
+            results = list(map(_score_chunk, *args))
+        else:
+            max_workers = min(n_jobs, len(hyp_chunks))
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_score_chunk, *args))
+
+        if not avg:
+            return list(itertools.chain.from_iterable(results))
+
+        scores, count = self._get_zero_scores(), 0
+        for chunk_scores, chunk_count in results:
+            scores = self._add_scores(scores, chunk_scores)
+            count += chunk_count
+        return self._divide_scores(scores, count)
+
+    def get_bootstrap_scores(self, hyps, refs, n_samples=1000,
+                             confidence=0.95, seed=None, ignore_empty=False,
+                             n_jobs=None, chunksize=None):
+        """Calculate bootstrap confidence intervals of the average scores.
+        Per-pair scores are kept in a (pairs, metrics * stats) array and
+        resampled with replacement `n_samples` times; resamples are drawn in
+        batches and averaged with a single matrix product per batch.
+        Args:
+          * hyps, refs, ignore_empty, n_jobs, chunksize: see `get_scores`
+          * n_samples (1000): number of bootstrap resamples
+          * confidence (0.95): width of the confidence interval
+          * seed (None): seed of the resampling random generator
+        Returns:
+          {metric: {stat: {"low": ..., "mid": ..., "high": ...}}} where
+          "mid" is the median of the resampled averages and "low"/"high"
+          the bounds of the `confidence` interval
+        """
+        import numpy as np
+
+        scores = self.get_scores(hyps, refs, ignore_empty=ignore_empty,
+                                 n_jobs=n_jobs, chunksize=chunksize)
+        if len(scores) == 0:
+            raise ValueError("Cannot bootstrap an empty set of scores")
+        values = np.array([[sc[m][s] for m in self.metrics
+                            for s in self.stats] for sc in scores],
+                          dtype=np.float64)
+
+        rng = np.random.default_rng(seed)
+        count = len(values)
+        batch_size = max(1, Rouge.BOOTSTRAP_BATCH_CELLS // count)
+        sample_means = np.empty((n_samples, values.shape[1]))
+        for start in range(0, n_samples, batch_size):
+            size = min(batch_size, n_samples - start)
+            # Row k of `ids` draws indices in [k * count, (k + 1) * count[
+            # so that one bincount yields the per-sample pair weights
+            ids = rng.integers(0, count, size=(size, count))
+            ids += np.arange(size)[:, None] * count
+            weights = np.bincount(ids.ravel(), minlength=size * count)
+            weights = weights.reshape(size, count)
+            sample_means[start:start + size] = weights.dot(values) / count
+
+        alpha = 100 * (1 - confidence) / 2
+        low, mid, high = np.percentile(
+            sample_means, [alpha, 50, 100 - alpha], axis=0)
+
+        intervals = {}
+        for k, (m, s) in enumerate(
+                itertools.product(self.metrics, self.stats)):
+            intervals.setdefault(m, {})[s] = {
+                "low": float(low[k]),
+                "mid": float(mid[k]),
+                "high": float(high[k]),
+            }
+        return intervals
+
+    def get_score_matrix(self, hyps, refs, pairs=None, as_frame=False):
+        """Calculate ROUGE scores between many hypotheses and references.
+        Each text is tokenized once and its n-grams and LCS inputs are
+        reused for every pair it is involved in.
+        Args:
+          * hyps: hypothesis texts (strings or `rouge_score.PreparedText`)
+          * refs: reference texts (strings or `rouge_score.PreparedText`)
+          * pairs (None): (hyp_index, ref_index) pairs to score, every
+                          hyp against every ref when None
+          * as_frame (False): whether to return a DataFrame instead of an
+                              array
+        Returns:
+          a float array of shape
+          (len(hyps), len(refs), len(self.metrics), len(self.stats)),
+          NaN for pairs that were not scored; or, with `as_frame`, a
+          DataFrame indexed by (hyp, ref) for the scored pairs with
+          (metric, stat) columns
+        """
+        import numpy as np
+
+        hyps, refs = list(hyps), list(refs)
+        if pairs is None:
+            pairs = [(i, j) for i in range(len(hyps))
+                     for j in range(len(refs))]
+        pairs = list(pairs)
+        for i, j in pairs:
+            if not (0 <= i < len(hyps) and 0 <= j < len(refs)):
+                raise ValueError("Unknown pair (%d, %d)" % (i, j))
+
+        sequences = rouge_score.prepare_texts(hyps + refs)
+        scores_ids = [(i, len(hyps) + j) for i, j in pairs]
+        hyp_ids = np.array([i for i, _ in pairs], dtype=np.intp)
+        ref_ids = np.array([j for _, j in pairs], dtype=np.intp)
+
+        matrix = np.full(
+            (len(hyps), len(refs), len(self.metrics), len(self.stats)),
+            np.nan)
+        for k, m in enumerate(self.metrics):
+            fn = Rouge.AVAILABLE_MULTI_METRICS[m]
+            scores = fn(sequences, scores_ids,
+                        raw_results=self.raw_results,
+                        exclusive=self.exclusive)
+            matrix[hyp_ids, ref_ids, k] = [[sc[s] for s in self.stats]
+                                           for sc in scores]
+
+        if not as_frame:
+            return matrix
+
+        import pandas as pd
+        index = pd.MultiIndex.from_arrays([hyp_ids, ref_ids],
+                                          names=["hyp", "ref"])
+        columns = pd.MultiIndex.from_product([self.metrics, self.stats],
+                                             names=["metric", "stat"])
+        values = matrix[hyp_ids, ref_ids].reshape(len(pairs), -1)
+        return pd.DataFrame(values, index=index, columns=columns)
+
+    def _get_pair_scores(self, hyp, ref, vocab, raw_results=False):
+        """Scores one pair, `ref` being a text or a list of texts.
+        Returns ({metric: scores}, hyp length, ref length), the ref length
+        being the mean length of the references for a list of texts.
+        """
+        if not isinstance(ref, (list, tuple)):
+            hyp, ref = rouge_score.prepare_texts([hyp, ref], vocab=vocab)
+            scores = {
+                m: Rouge.AVAILABLE_METRICS[m](hyp, ref,
+                                              raw_results=raw_results,
+                                              exclusive=self.exclusive)
+                for m in self.metrics
+            }
+            return scores, hyp.length, ref.length
+
+        if len(ref) == 0:
+            raise ValueError("Empty list of references.")
+        texts = rouge_score.prepare_texts([hyp] + list(ref), vocab=vocab)
+        hyp, refs = texts[0], texts[1:]
+
+        scores = {}
+        for m in self.metrics:
+            fn = Rouge.AVAILABLE_METRICS[m]
+            ref_scores = [fn(hyp, r, raw_results=raw_results,
+                             exclusive=self.exclusive)
+                          for r in refs]
+            if self.multi_ref_agg == "max":
+                key = "overlap" if raw_results else "f-1"
+                scores[m] = max(ref_scores, key=lambda sc: sc[key])
+            else:
+                scores[m] = {
+                    s: sum(sc[s] for sc in ref_scores) / len(ref_scores)
+                    for s in ref_scores[0]
+                }
+        ref_length = sum(r.length for r in refs) / len(refs)
+        return scores, hyp.length, ref_length
+
+    def _iter_pair_scores(self, hyps, refs, raw_results=False):
+        """Yields `_get_pair_scores` of every pair. With the "numpy"
+        backend, ROUGE-N is computed for batches of `DEFAULT_CHUNKSIZE`
+        pairs at once, so memory does not grow with the number of pairs.
+        """
+        if self.backend == "numpy":
+            pairs, chunksize = zip(hyps, refs), Rouge.DEFAULT_CHUNKSIZE
+            while True:
+                chunk = list(itertools.islice(pairs, chunksize))
+                if len(chunk) == 0:
+                    break
+                hyp_chunk, ref_chunk = zip(*chunk)
+                for scores in self._iter_batch_scores(hyp_chunk, ref_chunk,
+                                                      raw_results):
+                    yield scores
+            return
+
+        vocab = rouge_score.TokenVocabulary()
         for hyp, ref in zip(hyps, refs):
-            sen_score = {}
+            yield self._get_pair_scores(hyp, ref, vocab,
+                                        raw_results=raw_results)
 
-            hyp = [" ".join(_.split()) for _ in hyp.split(".") if len(_) > 0]
-            ref = [" ".join(_.split()) for _ in ref.split(".") if len(_) > 0]
+    def _iter_batch_scores(self, hyps, refs, raw_results=False):
+        """Yields `_get_pair_scores` of a batch of pairs, ROUGE-N of all of
+        them being computed at once (batches with several references, or
+        an empty text, are scored by the Python path)
+        """
+        vocab = rouge_score.TokenVocabulary()
+        if not any(isinstance(ref, (list, tuple)) for ref in refs):
+            others = [m for m in self.metrics
+                      if m not in Rouge.AVAILABLE_BATCH_METRICS]
+            if others or not all(isinstance(text, six.string_types)
+                                 for text in itertools.chain(hyps, refs)):
+                # tokenized once for the batch and the other metrics
+                pairs = [rouge_score.prepare_texts([hyp, ref], vocab=vocab)
+                         for hyp, ref in zip(hyps, refs)]
+                hyps = [hyp for hyp, _ in pairs]
+                refs = [ref for _, ref in pairs]
+            tokens = rouge_score.TokenBatch(list(hyps) + list(refs))
+            if min(tokens.num_sentences, default=1) > 0:
+                batch = {
+                    m: Rouge.AVAILABLE_BATCH_METRICS[m](
+                        hyps, refs, raw_results=raw_results,
+                        exclusive=self.exclusive, tokens=tokens)
+                    for m in self.metrics
+                    if m in Rouge.AVAILABLE_BATCH_METRICS
+                }
+                num_pairs = len(hyps)
+                for i, (hyp, ref) in enumerate(zip(hyps, refs)):
+                    scores = {m: batch[m][i] for m in batch}
+                    for m in others:
+                        scores[m] = Rouge.AVAILABLE_METRICS[m](
+                            hyp, ref, raw_results=raw_results,
+                            exclusive=self.exclusive)
+                    yield (scores, tokens.word_counts[i],
+                           tokens.word_counts[num_pairs + i])
+                return
 
-            for m in self.metrics:
-                fn = Rouge.AVAILABLE_METRICS[m]
-                sc = fn(
-                    hyp,
-                    ref,
-                    raw_results=self.raw_results,
-                    exclusive=self.exclusive)
-                sen_score[m] = {s: sc[s] for s in self.stats}
+        for hyp, ref in zip(hyps, refs):
+            yield self._get_pair_scores(hyp, ref, vocab,
+                                        raw_results=raw_results)
+
+    def _get_scores(self, hyps, refs):
+        scores = []
+        for pair_scores, hyp_length, ref_length in self._iter_pair_scores(
+                hyps, refs, raw_results=self.raw_results):
+            sen_score = {m: {s: pair_scores[m][s] for s in self.stats}
+                         for m in self.metrics}
 
             if self.return_lengths:
                 lengths = {
-                    "hyp": len(" ".join(hyp).split()),
-                    "ref": len(" ".join(ref).split())
+                    "hyp": hyp_length,
+                    "ref": ref_length
                 }
                 sen_score["lengths"] = lengths
             scores.append(sen_score)
         return scores
 
-    def _get_avg_scores(self, hyps, refs):
+    def _get_zero_scores(self):
         scores = {m: {s: 0 for s in self.stats} for m in self.metrics}
         if self.return_lengths:
             scores["lengths"] = {"hyp": 0, "ref": 0}
+        return scores
 
-        count = 0
-        for (hyp, ref) in zip(hyps, refs):
-            hyp = [" ".join(_.split()) for _ in hyp.split(".") if len(_) > 0]
-            ref = [" ".join(_.split()) for _ in ref.split(".") if len(_) > 0]
-
-            for m in self.metrics:
-                fn = Rouge.AVAILABLE_METRICS[m]
-                sc = fn(hyp, ref, exclusive=self.exclusive)
-                scores[m] = {s: scores[m][s] + sc[s] for s in self.stats}
-
-            if self.return_lengths:
-                scores["lengths"]["hyp"] += len(" ".join(hyp).split())
-                scores["lengths"]["ref"] += len(" ".join(ref).split())
+    def _add_scores(self, scores, other):
+        total = {
+            m: {s: scores[m][s] + other[m][s] for s in self.stats}
+            for m in self.metrics
+        }
+        if self.return_lengths:
+            total["lengths"] = {
+                k: scores["lengths"][k] + other["lengths"][k]
+                for k in ["hyp", "ref"]
+            }
+        return total
 
-            count += 1
+    def _divide_scores(self, scores, count):
         avg_scores = {
             m: {s: scores[m][s] / count for s in self.stats}
             for m in self.metrics
@@ -165,3 +533,32 @@ class Rouge:
             }
 
         return avg_scores
+
+    def _get_sum_scores(self, hyps, refs):
+        scores = self._get_zero_scores()
+
+        count = 0
+        for pair_scores, hyp_length, ref_length in self._iter_pair_scores(
+                hyps, refs):
+
+            for m in self.metrics:
+                sc = pair_scores[m]
+                scores[m] = {s: scores[m][s] + sc[s] for s in self.stats}
+
+            if self.return_lengths:
+                scores["lengths"]["hyp"] += hyp_length
+                scores["lengths"]["ref"] += ref_length
+
+            count += 1
+        return scores, count
+
+    def _get_avg_scores(self, hyps, refs):
+        scores, count = self._get_sum_scores(hyps, refs)
+        return self._divide_scores(scores, count)
+
+
+def _score_chunk(rouge, hyps, refs, avg):
+    """Scores one chunk of pairs, possibly in a worker process"""
+    if avg:
+        return rouge._get_sum_scores(hyps, refs)
+    return rouge._get_scores(hyps, refs)
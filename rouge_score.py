@@ -28,47 +28,45 @@ from __future__ import absolute_import
 from __future__ import division, print_function, unicode_literals
 import itertools
 
-from copy import deepcopy
+from array import array
+from collections import Counter
 
 
 class Ngrams(object):
     """
-        Ngrams datastructure based on `set` or `list`
+        Ngrams datastructure based on `set` or `collections.Counter`
         depending in `exclusive`
+
+        When not exclusive, the n-grams are kept as a multiset (n-gram ->
+        occurrences) so that clipped intersection and union are linear in
+        the number of distinct n-grams.
     """
 
     def __init__(self, ngrams={}, exclusive=True):
         if exclusive:
             self._ngrams = set(ngrams)
         else:
-            self._ngrams = list(ngrams)
+            self._ngrams = Counter(ngrams)
         self.exclusive = exclusive
 
     def add(self, o):
         if self.exclusive:
             self._ngrams.add(o)
         else:
-            self._ngrams.append(o)
+            self._ngrams[o] += 1
 
     def __len__(self):
-        return len(self._ngrams)
+        if self.exclusive:
+            return len(self._ngrams)
+        return sum(self._ngrams.values())
 
     def intersection(self, o):
         if self.exclusive:
             inter_set = self._ngrams.intersection(o._ngrams)
             return Ngrams(inter_set, exclusive=True)
         else:
-            other_list = deepcopy(o._ngrams)
-            inter_list = []
-
-            for e in self._ngrams:
-                try:
-                    i = other_list.index(e)
-                except ValueError:
-                    continue
-                other_list.pop(i)
-                inter_list.append(e)
-            return Ngrams(inter_list, exclusive=False)
+            inter_counts = self._ngrams & o._ngrams
+            return Ngrams(inter_counts, exclusive=False)
 
     def union(self, *ngrams):
         if self.exclusive:
@@ -77,10 +75,106 @@ class Ngrams(object):
                 union_set = union_set.union(o._ngrams)
             return Ngrams(union_set, exclusive=True)
         else:
-            union_list = deepcopy(self._ngrams)
+            union_counts = Counter(self._ngrams)
             for o in ngrams:
-                union_list.extend(o._ngrams)
-            return Ngrams(union_list, exclusive=False)
+                union_counts.update(o._ngrams)
+            return Ngrams(union_counts, exclusive=False)
+
+
+class TokenVocabulary(object):
+    """
+        Interns tokens into dense integer ids so that texts sharing a
+        vocabulary are compared on integers instead of strings
+    """
+
+    def __init__(self):
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def intern(self, tokens):
+        ids = self._ids
+        return [ids.setdefault(token, len(ids)) for token in tokens]
+
+
+class PreparedText(object):
+    """
+        A text tokenized once and shared by every ROUGE metric.
+
+        Holds the sentence split, the interned token ids of each sentence
+        and lazily built n-gram tables, cached per `n` and `exclusive`.
+        Texts are only comparable when they share the same `vocab`: pass
+        one `TokenVocabulary` to the texts to compare, or use
+        `prepare_texts`. When none is given the text gets its own, so no
+        vocabulary outlives the texts using it.
+    """
+
+    def __init__(self, sentences, vocab=None):
+        if vocab is None:
+            vocab = TokenVocabulary()
+        self.vocab = vocab
+        self.sentences = list(sentences)
+        self.sentence_ids = [vocab.intern(s.split(" "))
+                             for s in self.sentences]
+        self.token_ids = list(itertools.chain(*self.sentence_ids))
+        self.length = sum(len(s.split()) for s in self.sentences)
+        self._ngrams = {}
+
+    @classmethod
+    def from_text(cls, text, vocab=None):
+        """Splits `text` into sentences on "." and normalizes whitespace"""
+        sentences = [" ".join(_.split()) for _ in text.split(".")
+                     if len(_) > 0]
+        return cls(sentences, vocab=vocab)
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def ngrams(self, n, exclusive=True):
+        """Returns the (cached) n-grams of the text, do not mutate them"""
+        key = (n, exclusive)
+        ngrams = self._ngrams.get(key)
+        if ngrams is None:
+            ngrams = _get_ngrams(n, self.token_ids, exclusive=exclusive)
+            self._ngrams[key] = ngrams
+        return ngrams
+
+
+def prepare_texts(texts, vocab=None):
+    """
+    Converts texts to `PreparedText` sharing a single vocabulary.
+
+    Args:
+      texts: iterable of `PreparedText`, raw strings or lists of sentences
+      vocab: vocabulary for texts that still need to be prepared, used
+             when none of `texts` is already prepared. Defaults to a new
+             vocabulary
+
+    Returns:
+      list of `PreparedText`
+
+    Raises:
+      ValueError: if prepared texts do not share the same vocabulary
+    """
+    texts = list(texts)
+    vocab = next((t.vocab for t in texts if isinstance(t, PreparedText)),
+                 vocab)
+    if vocab is None:
+        vocab = TokenVocabulary()
+
+    prepared = []
+    for text in texts:
+        if isinstance(text, PreparedText):
+            if text.vocab is not vocab:
+                raise ValueError(
+                    "Prepared texts must share the same vocabulary.")
+        elif isinstance(text, str):
+            text = PreparedText.from_text(text, vocab=vocab)
+        else:
+            text = PreparedText(text, vocab=vocab)
+        prepared.append(text)
+    return prepared
 
 
 def _get_ngrams(n, text, exclusive=True):
@@ -112,6 +206,8 @@ def _get_word_ngrams(n, sentences, exclusive=True):
     assert len(sentences) > 0
     assert n > 0
 
+    if isinstance(sentences, PreparedText):
+        return sentences.ngrams(n, exclusive=exclusive)
     words = _split_into_words(sentences)
     return _get_ngrams(n, words, exclusive=exclusive)
 
@@ -120,18 +216,35 @@ def _len_lcs(x, y):
     """
     Returns the length of the Longest Common Subsequence between sequences x
     and y.
-    Source: http://www.algorithmist.com/index.php/Longest_Common_Subsequence
+
+    Uses the bit-parallel formulation of the LCS recurrence (Allison-Dix /
+    Hyyro): each row of the DP table is packed into the bits of a single
+    (arbitrary precision) integer, so the whole computation takes
+    O(len(y) * len(x) / wordsize) time and O(len(x)) space.
 
     Args:
-      x: sequence of words
-      y: sequence of words
+      x: sequence of words (or interned token ids)
+      y: sequence of words (or interned token ids)
 
     Returns
       integer: Length of LCS between x and y
     """
-    table = _lcs(x, y)
-    n, m = len(x), len(y)
-    return table[n, m]
+    if len(x) < len(y):
+        x, y = y, x
+    n = len(x)
+    if n == 0 or len(y) == 0:
+        return 0
+
+    match_masks = {}
+    for i, token in enumerate(x):
+        match_masks[token] = match_masks.get(token, 0) | (1 << i)
+
+    full_mask = (1 << n) - 1
+    v = full_mask
+    for token in y:
+        u = v & match_masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full_mask
+    return n - bin(v).count("1")
 
 
 def _lcs(x, y):
@@ -146,18 +259,26 @@ def _lcs(x, y):
       y: collection of words
 
     Returns:
-      Table of dictionary of coord and len lcs
+      Table as a list of `len(x) + 1` integer arrays of `len(y) + 1` cells,
+      i.e. `table[i][j]` is the len lcs of `x[:i]` and `y[:j]`
     """
     n, m = len(x), len(y)
-    table = dict()
-    for i in range(n + 1):
-        for j in range(m + 1):
-            if i == 0 or j == 0:
-                table[i, j] = 0
-            elif x[i - 1] == y[j - 1]:
-                table[i, j] = table[i - 1, j - 1] + 1
+    prev_row = [0] * (m + 1)
+    table = [array("i", prev_row)]
+    for i in range(n):
+        x_i = x[i]
+        row = [0] * (m + 1)
+        left = 0
+        for j in range(m):
+            if x_i == y[j]:
+                left = prev_row[j] + 1
             else:
-                table[i, j] = max(table[i - 1, j], table[i, j - 1])
+                up = prev_row[j + 1]
+                if up > left:
+                    left = up
+            row[j + 1] = left
+        table.append(array("i", row))
+        prev_row = row
     return table
 
 
@@ -166,6 +287,10 @@ def _recon_lcs(x, y, exclusive=True):
     Returns the Longest Subsequence between x and y.
     Source: http://www.algorithmist.com/index.php/Longest_Common_Subsequence
 
+    The table is walked back iteratively (no recursion, so long sentences do
+    not hit the interpreter recursion limit) with the same tie-breaking as
+    the reference recursive implementation.
+
     Args:
       x: sequence of words
       y: sequence of words
@@ -176,42 +301,43 @@ def _recon_lcs(x, y, exclusive=True):
     i, j = len(x), len(y)
     table = _lcs(x, y)
 
-    def _recon(i, j):
-        """private recon calculation"""
-        if i == 0 or j == 0:
-            return []
-        elif x[i - 1] == y[j - 1]:
-            return _recon(i - 1, j - 1) + [(x[i - 1], i)]
-        elif table[i - 1, j] > table[i, j - 1]:
-            return _recon(i - 1, j)
+    recon_list = []
+    while i > 0 and j > 0:
+        if x[i - 1] == y[j - 1]:
+            recon_list.append(x[i - 1])
+            i -= 1
+            j -= 1
+        elif table[i - 1][j] > table[i][j - 1]:
+            i -= 1
         else:
-            return _recon(i, j - 1)
-
-    recon_list = list(map(lambda x: x[0], _recon(i, j)))
+            j -= 1
+    recon_list.reverse()
     return Ngrams(recon_list, exclusive=exclusive)
-    return recon_tuple
 
 
-def multi_rouge_n(sequences, scores_ids, n=2, exclusive=True):
+def multi_rouge_n(sequences, scores_ids, n=2, raw_results=False,
+                  exclusive=True):
     """
     Efficient way to compute highly repetitive scoring
     i.e. sequences are involved multiple time
 
     Args:
-        sequences(list[str]): list of sequences (either hyp or ref)
+        sequences(list[str]): list of sequences (either hyp or ref), each
+            a list of sentences or a `PreparedText`
         scores_ids(list[tuple(int)]): list of pairs (hyp_id, ref_id)
             ie. scores[i] = rouge_n(scores_ids[i][0],
                                     scores_ids[i][1])
 
     Returns:
         scores: list of length `len(scores_ids)` containing rouge `n`
-                scores as a dict with 'f', 'r', 'p'
+                scores as a dict with 'f', 'r', 'p' (or 'hyp', 'ref',
+                'overlap' counts if `raw_results`)
     Raises:
         KeyError: if there's a value of i in scores_ids that is not in
                   [0, len(sequences)[
     """
     ngrams = [_get_word_ngrams(n, sequence, exclusive=exclusive)
-              for sequence in sequences]
+              for sequence in prepare_texts(sequences)]
     counts = [len(ngram) for ngram in ngrams]
 
     scores = []
@@ -225,11 +351,207 @@ def multi_rouge_n(sequences, scores_ids, n=2, exclusive=True):
         overlapping_ngrams = evaluated_ngrams.intersection(reference_ngrams)
         overlapping_count = len(overlapping_ngrams)
 
-        scores += [f_r_p_rouge_n(evaluated_count,
-                                 reference_count, overlapping_count)]
+        if raw_results:
+            scores += [{"hyp": evaluated_count,
+                        "ref": reference_count,
+                        "overlap": overlapping_count}]
+        else:
+            scores += [f_r_p_rouge_n(evaluated_count,
+                                     reference_count, overlapping_count)]
     return scores
 
 
+def multi_rouge_l(sequences, scores_ids, raw_results=False, exclusive=True):
+    """
+    ROUGE-L (summary level) counterpart of `multi_rouge_n`: every sequence
+    is tokenized once and its sentences and word counts are reused for all
+    the pairs it is involved in.
+
+    Args:
+        sequences(list[str]): list of sequences (either hyp or ref), each
+            a list of sentences or a `PreparedText`
+        scores_ids(list[tuple(int)]): list of pairs (hyp_id, ref_id)
+            ie. scores[i] = rouge_l_summary_level(scores_ids[i][0],
+                                                  scores_ids[i][1])
+
+    Returns:
+        scores: list of length `len(scores_ids)` containing rouge `l`
+                scores as returned by `rouge_l_summary_level`
+    """
+    sequences = prepare_texts(sequences)
+
+    scores = []
+    for hyp_id, ref_id in scores_ids:
+        scores += [rouge_l_summary_level(sequences[hyp_id],
+                                         sequences[ref_id],
+                                         raw_results=raw_results,
+                                         exclusive=exclusive)]
+    return scores
+
+
+def _ngram_codes(np, tokens, n):
+    """Exact int64 codes of the n-grams starting at each position of
+    `tokens`: polynomial in the token ids, renumbered densely whenever the
+    next step could overflow"""
+    size = len(tokens) - n + 1
+    if size <= 0:
+        return tokens[:0].copy()
+    codes = tokens[:size].copy()
+    base = int(tokens.max()) + 1
+    for k in range(1, n):
+        if (int(codes.max()) + 1) * base >= 1 << 63:
+            codes = np.unique(codes, return_inverse=True)[1] \
+                .astype(np.int64).ravel()
+        codes = codes * base + tokens[k:k + size]
+    return codes
+
+
+class TokenBatch(object):
+    """
+        Token ids of many texts concatenated in one NumPy array, shared by
+        the batched metrics.
+
+        Raw strings are split like `PreparedText.from_text` and interned
+        together, all at once; `PreparedText` keep their own token ids, so
+        the texts of a pair must share a vocabulary. Strings and prepared
+        texts cannot be mixed in a batch.
+    """
+
+    def __init__(self, texts):
+        import numpy as np
+
+        texts = list(texts)
+        if all(isinstance(t, str) for t in texts):
+            tokens, lengths = [], []
+            self.num_sentences, self.word_counts = [], []
+            for text in texts:
+                pieces = [_ for _ in text.split(".") if len(_) > 0]
+                count, word_count = len(tokens), 0
+                for piece in pieces:
+                    words = piece.split()
+                    word_count += len(words)
+                    # a blank sentence is a single empty token
+                    tokens.extend(words or [""])
+                lengths.append(len(tokens) - count)
+                self.num_sentences.append(len(pieces))
+                self.word_counts.append(word_count)
+            ids = {t: i for i, t in enumerate(dict.fromkeys(tokens))}
+            self.token_ids = np.fromiter(map(ids.__getitem__, tokens),
+                                         dtype=np.int64, count=len(tokens))
+        elif all(isinstance(t, PreparedText) for t in texts):
+            lengths = [len(t.token_ids) for t in texts]
+            self.num_sentences = [len(t) for t in texts]
+            self.word_counts = [t.length for t in texts]
+            self.token_ids = np.fromiter(
+                itertools.chain.from_iterable(t.token_ids for t in texts),
+                dtype=np.int64, count=sum(lengths))
+        else:
+            raise ValueError(
+                "Texts must be all strings or all `PreparedText`.")
+        self.lengths = np.array(lengths, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.lengths)
+
+
+def batch_rouge_n(evaluated, references, n=2, raw_results=False,
+                  exclusive=True, tokens=None):
+    """
+    Computes ROUGE-N of many pairs (evaluated[i], references[i]) at once
+    with NumPy: the token ids of all the texts are concatenated, every
+    n-gram is encoded as an int64 and the overlaps of all the pairs are
+    counted with sorts and `np.unique` instead of Python sets and
+    Counters. Results are the same as `rouge_n` pair by pair.
+
+    Args:
+      evaluated: hypotheses, raw strings or `PreparedText`
+      references: references, same type as `evaluated`, a prepared one
+                  sharing the vocabulary of its hypothesis
+      n: Size of ngram.  Defaults to 2.
+      tokens: `TokenBatch` of `evaluated + references`, to reuse it
+              between calls
+
+    Returns:
+      list of length `len(evaluated)` of scores as returned by `rouge_n`
+
+    Raises:
+      ValueError: if the lists differ in length or a text is empty
+    """
+    import numpy as np
+
+    if len(evaluated) != len(references):
+        raise ValueError("Hypotheses and references differ in length.")
+    num_pairs = len(evaluated)
+    if tokens is None:
+        tokens = TokenBatch(list(evaluated) + list(references))
+    for hyp_sentences, ref_sentences in zip(tokens.num_sentences[:num_pairs],
+                                            tokens.num_sentences[num_pairs:]):
+        if hyp_sentences <= 0:
+            raise ValueError("Hypothesis is empty.")
+        if ref_sentences <= 0:
+            raise ValueError("Reference is empty.")
+
+    num_texts = 2 * num_pairs
+    lengths = tokens.lengths
+
+    # n-grams of the concatenation, minus the ones spanning two texts
+    codes = _ngram_codes(np, tokens.token_ids, n)
+    text_ids = np.repeat(np.arange(num_texts, dtype=np.int64),
+                         lengths)[:len(codes)]
+    valid = np.arange(len(codes)) + n <= np.cumsum(lengths)[text_ids]
+    codes, text_ids = codes[valid], text_ids[valid]
+
+    # One sort of the (pair, n-gram, side) keys groups the occurrences of
+    # each n-gram of each text, the hypothesis group of a pair right before
+    # the reference one
+    sides = (text_ids >= num_pairs).astype(np.int64)
+    pair_ids = text_ids - sides * num_pairs
+    num_codes = int(codes.max()) + 1 if len(codes) else 1
+    if 2 * max(num_pairs, 1) * num_codes >= 1 << 63:
+        codes = np.unique(codes, return_inverse=True)[1] \
+            .astype(np.int64).ravel()
+        num_codes = int(codes.max()) + 1
+    keys = np.sort((pair_ids * num_codes + codes) * 2 + sides)
+    starts = np.flatnonzero(np.concatenate(([len(keys) > 0],
+                                            keys[1:] != keys[:-1])))
+    group_keys = keys[starts]
+    group_counts = np.diff(np.append(starts, len(keys)))
+    if exclusive:
+        group_texts = (group_keys & 1) * num_pairs \
+            + (group_keys >> 1) // num_codes
+        text_counts = np.bincount(group_texts, minlength=num_texts)
+        group_counts = np.ones_like(group_counts)
+    else:
+        text_counts = np.bincount(text_ids, minlength=num_texts)
+
+    group_ngrams = group_keys >> 1
+    both = np.flatnonzero(group_ngrams[1:] == group_ngrams[:-1])
+    overlap = np.bincount(group_ngrams[both] // num_codes,
+                          weights=np.minimum(group_counts[both],
+                                             group_counts[both + 1]),
+                          minlength=num_pairs).astype(np.int64)
+
+    evaluated_count = text_counts[:num_pairs]
+    reference_count = text_counts[num_pairs:]
+    if raw_results:
+        return [{"hyp": h, "ref": r, "overlap": o}
+                for h, r, o in zip(evaluated_count.tolist(),
+                                   reference_count.tolist(),
+                                   overlap.tolist())]
+
+    # Same operations as `f_r_p_rouge_n`, so the floats are identical
+    precision = np.zeros(num_pairs)
+    np.divide(overlap, evaluated_count, out=precision,
+              where=evaluated_count != 0)
+    recall = np.zeros(num_pairs)
+    np.divide(overlap, reference_count, out=recall,
+              where=reference_count != 0)
+    f1_score = 2.0 * ((precision * recall) / (precision + recall + 1e-8))
+    return [{"f-1": f, "precision": p, "recall": r}
+            for f, p, r in zip(f1_score.tolist(), precision.tolist(),
+                               recall.tolist())]
+
+
 def rouge_n(evaluated_sentences, reference_sentences,
             n=2, raw_results=False, exclusive=True):
     """
@@ -239,8 +561,9 @@ def rouge_n(evaluated_sentences, reference_sentences,
 
     Args:
       evaluated_sentences: The sentences that have been picked by the
-                           summarizer
-      reference_sentences: The sentences from the referene set
+                           summarizer (or a `PreparedText`)
+      reference_sentences: The sentences from the referene set (or a
+                           `PreparedText`)
       n: Size of ngram.  Defaults to 2.
 
     Returns:
@@ -249,15 +572,15 @@ def rouge_n(evaluated_sentences, reference_sentences,
     Raises:
       ValueError: raises exception if a param has len <= 0
     """
-    if len(evaluated_sentences) <= 0:
+    evaluated, reference = prepare_texts(
+        [evaluated_sentences, reference_sentences])
+    if len(evaluated) <= 0:
         raise ValueError("Hypothesis is empty.")
-    if len(reference_sentences) <= 0:
+    if len(reference) <= 0:
         raise ValueError("Reference is empty.")
 
-    evaluated_ngrams = _get_word_ngrams(
-        n, evaluated_sentences, exclusive=exclusive)
-    reference_ngrams = _get_word_ngrams(
-        n, reference_sentences, exclusive=exclusive)
+    evaluated_ngrams = _get_word_ngrams(n, evaluated, exclusive=exclusive)
+    reference_ngrams = _get_word_ngrams(n, reference, exclusive=exclusive)
     reference_count = len(reference_ngrams)
     evaluated_count = len(evaluated_ngrams)
 
@@ -317,21 +640,30 @@ def _union_lcs(evaluated_sentences, reference_sentence,
     ValueError:
       Raises exception if a param has len <= 0
     """
-    if prev_union is None:
-        prev_union = Ngrams(exclusive=exclusive)
-
     if len(evaluated_sentences) <= 0:
         raise ValueError("Collections must contain at least 1 sentence.")
 
+    return _union_lcs_words(
+        [_split_into_words([eval_s]) for eval_s in evaluated_sentences],
+        _split_into_words([reference_sentence]),
+        prev_union=prev_union, exclusive=exclusive)
+
+
+def _union_lcs_words(evaluated_words, reference_words,
+                     prev_union=None, exclusive=True):
+    """
+    Same as `_union_lcs` over already tokenized sentences (lists of words
+    or token ids), so that they are not split again for every reference
+    sentence.
+    """
+    if prev_union is None:
+        prev_union = Ngrams(exclusive=exclusive)
+
     lcs_union = prev_union
     prev_count = len(prev_union)
-    reference_words = _split_into_words([reference_sentence])
 
-    combined_lcs_length = 0
-    for eval_s in evaluated_sentences:
-        evaluated_words = _split_into_words([eval_s])
-        lcs = _recon_lcs(reference_words, evaluated_words, exclusive=exclusive)
-        combined_lcs_length += len(lcs)
+    for words in evaluated_words:
+        lcs = _recon_lcs(reference_words, words, exclusive=exclusive)
         lcs_union = lcs_union.union(lcs)
 
     new_lcs_count = len(lcs_union) - prev_count
@@ -358,8 +690,9 @@ def rouge_l_summary_level(
 
     Args:
       evaluated_sentences: The sentences that have been picked by the
-                           summarizer
-      reference_sentence: One of the sentences in the reference summaries
+                           summarizer (or a `PreparedText`)
+      reference_sentences: The sentences from the reference summaries (or a
+                           `PreparedText`)
 
     Returns:
       A float: F_lcs
@@ -367,30 +700,34 @@ def rouge_l_summary_level(
     Raises:
       ValueError: raises exception if a param has len <= 0
     """
-    if len(evaluated_sentences) <= 0 or len(reference_sentences) <= 0:
+    evaluated, reference = prepare_texts(
+        [evaluated_sentences, reference_sentences])
+    if len(evaluated) <= 0 or len(reference) <= 0:
         raise ValueError("Collections must contain at least 1 sentence.")
 
     # total number of words in reference sentences
-    m = len(
-        Ngrams(
-            _split_into_words(reference_sentences),
-            exclusive=exclusive))
+    m = len(reference.ngrams(1, exclusive=exclusive))
 
     # total number of words in evaluated sentences
-    n = len(
-        Ngrams(
-            _split_into_words(evaluated_sentences),
-            exclusive=exclusive))
+    n = len(evaluated.ngrams(1, exclusive=exclusive))
 
     # print("m,n %d %d" % (m, n))
     union_lcs_sum_across_all_references = 0
-    union = Ngrams(exclusive=exclusive)
-    for ref_s in reference_sentences:
-        lcs_count, union = _union_lcs(evaluated_sentences,
-                                      ref_s,
-                                      prev_union=union,
-                                      exclusive=exclusive)
-        union_lcs_sum_across_all_references += lcs_count
+    if exclusive:
+        union = Ngrams(exclusive=exclusive)
+        for reference_words in reference.sentence_ids:
+            lcs_count, union = _union_lcs_words(evaluated.sentence_ids,
+                                                reference_words,
+                                                prev_union=union,
+                                                exclusive=exclusive)
+            union_lcs_sum_across_all_references += lcs_count
+    else:
+        # Without exclusivity the union is a plain concatenation, so only
+        # the LCS lengths matter and no table has to be reconstructed
+        for reference_words in reference.sentence_ids:
+            for words in evaluated.sentence_ids:
+                union_lcs_sum_across_all_references += _len_lcs(
+                    reference_words, words)
 
     llcs = union_lcs_sum_across_all_references
     r_lcs = llcs / m
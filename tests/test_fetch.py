@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""`fetch.Fetcher` against a local stub server"""
+from __future__ import absolute_import
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("goose3")
+
+import requests  # noqa: E402
+
+from fetch import Fetcher, ResponseTooLarge  # noqa: E402
+
+PAGE = b"<html><body><p>" + b"Some words about the page. " * 20 \
+    + b"</p></body></html>"
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 21 Oct 2015 07:28:00 GMT"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path == "/etag":
+            if self.headers.get("If-None-Match") == ETAG:
+                return self._send(304, headers={"ETag": ETAG})
+            return self._send(200, PAGE, {"ETag": ETAG})
+        if self.path == "/last-modified":
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                return self._send(304)
+            return self._send(200, PAGE, {"Last-Modified": LAST_MODIFIED})
+        if self.path == "/plain":
+            return self._send(200, PAGE)
+        if self.path == "/big":
+            return self._send(200, b"x" * 4096)
+        if self.path == "/big-chunked":
+            # no Content-Length, the cap applies while reading
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for _ in range(4):
+                self.wfile.write(b"400\r\n" + b"x" * 1024 + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        if self.path == "/slow":
+            time.sleep(1)
+            return self._send(200, PAGE)
+        return self._send(404, b"not found")
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.daemon_threads = True
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server, path):
+    return "http://127.0.0.1:%d%s" % (server.server_port, path)
+
+
+def requests_to(server, path):
+    return [headers for p, headers in server.requests if p == path]
+
+
+def test_fresh_response_is_served_from_cache(server):
+    fetcher = Fetcher(ttl=60)
+    assert fetcher.fetch(url(server, "/plain")) == PAGE
+    assert fetcher.fetch(url(server, "/plain")) == PAGE
+    assert len(requests_to(server, "/plain")) == 1
+
+
+def test_stale_response_is_revalidated_with_etag(server):
+    fetcher = Fetcher(ttl=0)
+    assert fetcher.fetch(url(server, "/etag")) == PAGE
+    assert fetcher.fetch(url(server, "/etag")) == PAGE
+    first, second = requests_to(server, "/etag")
+    assert "If-None-Match" not in first
+    assert second["If-None-Match"] == ETAG
+
+
+def test_stale_response_is_revalidated_with_last_modified(server):
+    fetcher = Fetcher(ttl=0)
+    assert fetcher.fetch(url(server, "/last-modified")) == PAGE
+    assert fetcher.fetch(url(server, "/last-modified")) == PAGE
+    _, second = requests_to(server, "/last-modified")
+    assert second["If-Modified-Since"] == LAST_MODIFIED
+
+
+def test_revalidation_refreshes_the_ttl(server):
+    fetcher = Fetcher(ttl=0.2)
+    fetcher.fetch(url(server, "/etag"))
+    count = len(requests_to(server, "/etag"))
+    time.sleep(0.3)
+    fetcher.fetch(url(server, "/etag"))
+    fetcher.fetch(url(server, "/etag"))
+    assert len(requests_to(server, "/etag")) == count + 1
+
+
+def test_body_over_max_bytes_is_rejected(server):
+    fetcher = Fetcher(max_bytes=1024)
+    with pytest.raises(ResponseTooLarge):
+        fetcher.fetch(url(server, "/big"))
+    with pytest.raises(ResponseTooLarge):
+        fetcher.fetch(url(server, "/big-chunked"))
+
+
+def test_read_timeout(server):
+    fetcher = Fetcher(read_timeout=0.2)
+    with pytest.raises(requests.exceptions.Timeout):
+        fetcher.fetch(url(server, "/slow"))
+
+
+def test_http_errors_are_raised_and_not_cached(server):
+    fetcher = Fetcher(ttl=60)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            fetcher.fetch(url(server, "/missing"))
+    assert len(requests_to(server, "/missing")) == 2
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""Import-time budget of the app, see benchmarks/check_import_time.py"""
+from __future__ import absolute_import
+
+import os
+import sys
+
+import pytest
+
+streamlit = pytest.importorskip("streamlit")
+pytest.importorskip("streamlit_option_menu")
+if not hasattr(streamlit, "experimental_memo"):
+    pytest.skip("main.py needs the experimental caching API of the pinned "
+                "streamlit", allow_module_level=True)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks"))
+
+from check_import_time import DEFAULT_BUDGET, check  # noqa: E402
+
+
+def test_import_time_budget():
+    seconds, failures = check(DEFAULT_BUDGET, repeat=5)
+    assert failures == [], "import main: %.1f ms, %s" % (
+        seconds * 1000, "; ".join(failures))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""`lexrank.SparseLexRankSummarizer` against sumy's `LexRankSummarizer`"""
+from __future__ import absolute_import
+
+import random
+
+import pytest
+
+pytest.importorskip("sumy")
+pytest.importorskip("scipy")
+
+from sumy.parsers.plaintext import PlaintextParser  # noqa: E402
+from sumy.summarizers.lex_rank import LexRankSummarizer  # noqa: E402
+
+from lexrank import SparseLexRankSummarizer  # noqa: E402
+
+WORDS = ("alpha beta gamma delta eps zeta eta theta iota kappa lambda mu "
+         "the a of data text").split()
+
+
+class WhitespaceTokenizer(object):
+    """Sentences end with ".", words are separated by whitespace, so the
+    tests do not need the NLTK punkt models"""
+    language = "english"
+
+    def to_sentences(self, paragraph):
+        return [s.strip() + "." for s in paragraph.split(".") if s.strip()]
+
+    def to_words(self, sentence):
+        return sentence.replace(".", " ").split()
+
+
+def random_document(rng):
+    sentences = [" ".join(rng.choice(WORDS)
+                          for _ in range(rng.randint(1, 12)))
+                 for _ in range(rng.randint(1, 40))]
+    return PlaintextParser.from_string(". ".join(sentences) + ".",
+                                       WhitespaceTokenizer()).document
+
+
+@pytest.mark.parametrize("sentences_count", [1, 3, 5])
+def test_same_summary_as_sumy(sentences_count):
+    rng = random.Random(sentences_count)
+    for _ in range(60):
+        document = random_document(rng)
+        expected = LexRankSummarizer()(document, sentences_count)
+        summary = SparseLexRankSummarizer()(document, sentences_count)
+        assert [str(s) for s in summary] == [str(s) for s in expected], \
+            [str(s) for s in document.sentences]
+
+
+def test_rate_sentences_of_an_empty_document():
+    document = PlaintextParser.from_string("", WhitespaceTokenizer()) \
+        .document
+    assert SparseLexRankSummarizer().rate_sentences(document) == {}
+    assert SparseLexRankSummarizer()(document, 3) == ()
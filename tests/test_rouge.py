@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""`Rouge` scores, pinned to the ones of the original scorer"""
+from __future__ import absolute_import
+
+import random
+
+import pytest
+
+import rouge_score
+from rouge import Rouge
+
+HYP = "the cat sat on the mat. the cat was happy"
+REF = "the cat was on the mat. a happy cat sat there"
+
+
+@pytest.mark.parametrize("exclusive, expected", [
+    (True, {
+        "rouge-1": {"recall": 0.7777777777777778, "precision": 1.0,
+                    "f-1": 0.8749999950781251},
+        "rouge-2": {"recall": 0.5, "precision": 0.625,
+                    "f-1": 0.555555550617284},
+        "rouge-l": {"recall": 0.6666666666666666,
+                    "precision": 0.8571428571428571,
+                    "f-1": 0.7499999950781251},
+    }),
+    (False, {
+        "rouge-1": {"recall": 0.8181818181818182, "precision": 0.9,
+                    "f-1": 0.8571428521541952},
+        "rouge-2": {"recall": 0.5, "precision": 0.5555555555555556,
+                    "f-1": 0.5263157844875347},
+        "rouge-l": {"recall": 1.0, "precision": 1.1,
+                    "f-1": 1.0476190426303855},
+    }),
+])
+def test_scores(exclusive, expected):
+    assert Rouge(exclusive=exclusive).get_scores(HYP, REF) == [expected]
+
+
+@pytest.mark.parametrize("exclusive, expected", [
+    (True, {"rouge-1": {"hyp": 7, "ref": 9, "overlap": 7},
+            "rouge-2": {"hyp": 8, "ref": 10, "overlap": 5},
+            "rouge-l": {"hyp": 7, "ref": 9, "overlap": 6}}),
+    (False, {"rouge-1": {"hyp": 10, "ref": 11, "overlap": 9},
+             "rouge-2": {"hyp": 9, "ref": 10, "overlap": 5},
+             "rouge-l": {"hyp": 10, "ref": 11, "overlap": 11}}),
+])
+def test_raw_scores(exclusive, expected):
+    rouge = Rouge(exclusive=exclusive, raw_results=True)
+    assert rouge.get_scores(HYP, REF) == [expected]
+
+
+def test_rouge_l_of_long_sentences():
+    # deeper than the recursion limit of the former recursive LCS
+    ref = " ".join("w%d" % i for i in range(1200))
+    hyp = " ".join("w%d" % i for i in range(0, 1200, 2))
+    assert rouge_score.rouge_l_summary_level(hyp, ref, raw_results=True) \
+        == {"hyp": 600, "ref": 1200, "overlap": 600}
+    scores = rouge_score.rouge_l_summary_level(hyp, ref)
+    assert scores["recall"] == 0.5
+    assert scores["precision"] == 1.0
+
+
+def random_text(rng):
+    words = ["a", "b", "c", "d", "the", "cat", " ", ""]
+    text = " ".join(rng.choice(words) for _ in range(rng.randint(1, 30)))
+    # some empty and blank sentences too
+    return "".join(ch + "." if rng.random() < 0.1 else ch for ch in text) \
+        or "a"
+
+
+@pytest.mark.parametrize("exclusive", [True, False])
+@pytest.mark.parametrize("raw_results", [True, False])
+def test_numpy_backend_matches_python(exclusive, raw_results):
+    pytest.importorskip("numpy")
+
+    rng = random.Random(0)
+    metrics = ["rouge-1", "rouge-2", "rouge-3", "rouge-l"]
+    for _ in range(50):
+        hyps = [random_text(rng) for _ in range(rng.randint(1, 20))]
+        refs = [random_text(rng) for _ in hyps]
+        scores = []
+        for backend in ("python", "numpy"):
+            rouge = Rouge(metrics=metrics, exclusive=exclusive,
+                          raw_results=raw_results, return_lengths=True,
+                          backend=backend)
+            try:
+                scores.append(rouge.get_scores(hyps, refs))
+            except ValueError as e:
+                scores.append(str(e))
+        assert scores[0] == scores[1], (hyps, refs)
+
+
+def test_prepared_texts_must_share_a_vocabulary():
+    hyp = rouge_score.PreparedText.from_text(HYP)
+    ref = rouge_score.PreparedText.from_text(REF)
+    with pytest.raises(ValueError):
+        Rouge().get_scores(hyp, ref)
+
+    vocab = rouge_score.TokenVocabulary()
+    hyp = rouge_score.PreparedText.from_text(HYP, vocab=vocab)
+    ref = rouge_score.PreparedText.from_text(REF, vocab=vocab)
+    assert Rouge().get_scores(hyp, ref) == Rouge().get_scores(HYP, REF)